@@ -1,6 +1,10 @@
 import asyncio
+import gc
+import importlib
 import logging
 
+from typing import Awaitable, Callable, Dict, List, Tuple
+
 from .settings import (
     DISCORD_TOKEN_PRICING,
     DISCORD_TOKEN_TVL,
@@ -11,16 +15,106 @@ from .settings import (
     STABLE_TOKEN_ADDRESS,
     PROTOCOL_NAME,
 )
-from .data import Token
+from .metrics import loop_lag
 from .helpers import (
+    LOGGER,
     LOGGING_HANDLER,
     LOGGING_LEVEL,
 )
-from .price import PriceBot
-from .tvl import TVLBot
-from .fees import FeesBot
-from .rewards import RewardsBot
-from .commander import CommanderBot
+
+
+async def get_token(token_address: str):
+    # web3, numpy and sqlite3 come along with data, import them once running
+    from .data import Token
+    from .snapshot import snapshots
+
+    # a restored (or, following a fetcher, a published) snapshot has the
+    # listed tokens already
+    snapshot = await (snapshots.get() if snapshots.follow else snapshots.restore())
+    token = snapshot.tokens.by_address(token_address) if snapshot else None
+    if token is not None:
+        return token
+    if snapshots.follow:
+        # followers leave RPC to the fetcher, which publishes all listed tokens
+        LOGGER.error(f"Token {token_address} is not listed in published snapshots")
+        return None
+    return await Token.get_by_token_address(token_address)
+
+
+async def price_bot_kwargs() -> Dict:
+    source_token, target_token = await asyncio.gather(
+        get_token(TOKEN_ADDRESS), get_token(STABLE_TOKEN_ADDRESS)
+    )
+    return dict(source_token=source_token, target_token=target_token)
+
+
+async def protocol_bot_kwargs() -> Dict:
+    return dict(protocol_name=PROTOCOL_NAME)
+
+
+async def no_kwargs() -> Dict:
+    return {}
+
+
+# discord token, bot module and factory, factory kwargs
+BOT_SPECS = [
+    (DISCORD_TOKEN_PRICING, ".price", "PriceBot", price_bot_kwargs),
+    (DISCORD_TOKEN_TVL, ".tvl", "TVLBot", protocol_bot_kwargs),
+    (DISCORD_TOKEN_FEES, ".fees", "FeesBot", protocol_bot_kwargs),
+    (DISCORD_TOKEN_REWARDS, ".rewards", "RewardsBot", protocol_bot_kwargs),
+    (DISCORD_TOKEN_COMMANDER, ".commander", "CommanderBot", no_kwargs),
+]
+
+# discord token, bot factory, factory kwargs
+LoadedBotSpec = Tuple[str, Callable, Callable[[], Awaitable[Dict]]]
+
+
+def load_bots() -> List[LoadedBotSpec]:
+    """Import bots that have discord tokens configured, and only those:
+    bot modules bring discord.py and the UI along
+
+    Returns:
+        List[LoadedBotSpec]: configured bots
+    """
+    return list(
+        map(
+            lambda spec: (
+                spec[0],
+                getattr(importlib.import_module(spec[1], __package__), spec[2]),
+                spec[3],
+            ),
+            filter(lambda spec: spec[0], BOT_SPECS),
+        )
+    )
+
+
+async def start_bot(
+    discord_token: str, factory: Callable, get_kwargs: Callable[[], Awaitable[Dict]]
+):
+    bot = factory(**await get_kwargs())
+    await bot.start(discord_token)
+
+
+async def run_snapshots():
+    from .snapshot import snapshots
+
+    await snapshots.restore()
+    await snapshots.start()
+
+
+async def run_bots(bot_specs: List[LoadedBotSpec]):
+    """Log bots in while the data they need gets loaded
+
+    Args:
+        bot_specs (List[LoadedBotSpec]): bots to run
+    """
+    # one snapshot engine feeds all the bots, starting off the last persisted
+    # snapshot while a fresh one gets built; none of it holds up logins, bots
+    # wait for a snapshot on their first tick or command. With no bots
+    # configured this just keeps publishing snapshots, see SNAPSHOT_FOLLOW
+    await asyncio.gather(
+        run_snapshots(), *map(lambda spec: start_bot(*spec), bot_specs)
+    )
 
 
 async def main():
@@ -31,26 +125,16 @@ async def main():
     discord_logger.setLevel(LOGGING_LEVEL)
     discord_logger.addHandler(LOGGING_HANDLER)
 
-    token = await Token.get_by_token_address(TOKEN_ADDRESS)
-    stable = await Token.get_by_token_address(STABLE_TOKEN_ADDRESS)
+    bot_specs = load_bots()
+    # snapshots feed all the bots, bring them in before freezing
+    importlib.import_module(".snapshot", __package__)
 
-    bot_specs = [
-        (DISCORD_TOKEN_PRICING, PriceBot(source_token=token, target_token=stable)),
-        (DISCORD_TOKEN_TVL, TVLBot(protocol_name=PROTOCOL_NAME)),
-        (DISCORD_TOKEN_FEES, FeesBot(protocol_name=PROTOCOL_NAME)),
-        (DISCORD_TOKEN_REWARDS, RewardsBot(protocol_name=PROTOCOL_NAME)),
-        (DISCORD_TOKEN_COMMANDER, CommanderBot()),
-    ]
-
-    # only run bots that have discord tokens configured
-    tasks = list(
-        map(
-            lambda spec: spec[1].start(spec[0]),
-            filter(lambda spec: spec[0], bot_specs),
-        )
-    )
+    # modules, ABIs and the like live as long as the process, keep full
+    # collections (which hold the GIL, stalling the loop) from rescanning them
+    gc.freeze()
 
-    await asyncio.gather(*tasks)
+    loop_lag.start()
+    await run_bots(bot_specs)
 
 
 if __name__ == "__main__":
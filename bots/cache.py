@@ -0,0 +1,253 @@
+import asyncio
+import collections
+import functools
+import time
+
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Tuple
+
+from .helpers import LOGGER, shared_future
+
+
+@dataclass
+class CacheStats:
+    """Per key cache counters and refresh timings"""
+
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    refresh_errors: int = 0
+    last_refresh_seconds: float = 0
+    total_refresh_seconds: float = 0
+
+    @property
+    def avg_refresh_seconds(self) -> float:
+        return self.total_refresh_seconds / self.refreshes if self.refreshes else 0
+
+
+def _make_key(args: Tuple, kwargs: Dict) -> Hashable:
+    return args + tuple(sorted(kwargs.items())) if kwargs else args
+
+
+def cache_stale_while_revalidate(
+    ttl_seconds: int, max_stale_seconds: int, maxsize: int = 128
+):
+    """Cache async function results, serving stale values while refreshing
+
+    Fresh values (younger than `ttl_seconds`) are returned as is. Stale values
+    are returned right away while a background refresh runs, as long as they
+    are younger than `max_stale_seconds`. Past that cutoff values are dropped
+    and callers wait for the refresh, whose errors (e.g. RPC deadlines) are
+    raised rather than answered with an older value. Concurrent refreshes of
+    the same key share a single call.
+
+    Args:
+        ttl_seconds (int): how long a value is considered fresh
+        max_stale_seconds (int): hard cutoff for serving stale values
+        maxsize (int, optional): max number of cached keys. Defaults to 128.
+    """
+
+    def decorator(fn: Callable):
+        values: collections.OrderedDict = collections.OrderedDict()
+        refreshes: Dict[Hashable, asyncio.Future] = {}
+        stats: Dict[Hashable, CacheStats] = collections.defaultdict(CacheStats)
+
+        async def _refresh(key: Hashable, args: Tuple, kwargs: Dict) -> Any:
+            started_at = time.monotonic()
+            try:
+                value = await fn(*args, **kwargs)
+            except Exception:
+                stats[key].refresh_errors += 1
+                raise
+            finally:
+                refreshes.pop(key, None)
+
+            elapsed = time.monotonic() - started_at
+            stats[key].refreshes += 1
+            stats[key].last_refresh_seconds = elapsed
+            stats[key].total_refresh_seconds += elapsed
+
+            now = time.monotonic()
+            values[key] = (value, now)
+            values.move_to_end(key)
+            # oldest first: evict past maxsize and anything too old to be served
+            while (
+                len(values) > maxsize
+                or now - next(iter(values.values()))[1] > max_stale_seconds
+            ):
+                evicted, _ = values.popitem(last=False)
+                stats.pop(evicted, None)
+
+            return value
+
+        def refresh(key: Hashable, args: Tuple, kwargs: Dict) -> asyncio.Future:
+            # single flight: everyone asking for the same key shares one refresh
+            if key not in refreshes:
+                refreshes[key] = shared_future(_refresh(key, args, kwargs))
+            return refreshes[key]
+
+        def log_background_failure(task: asyncio.Future):
+            if not task.cancelled() and task.exception() is not None:
+                LOGGER.error(
+                    f"Background refresh of {fn.__qualname__} failed with {task.exception()}"
+                )
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            cached = values.get(key)
+
+            if cached is not None:
+                value, fetched_at = cached
+                age = time.monotonic() - fetched_at
+
+                if age < ttl_seconds:
+                    stats[key].hits += 1
+                    return value
+
+                if age < max_stale_seconds:
+                    stats[key].stale_hits += 1
+                    if key not in refreshes:
+                        refresh(key, args, kwargs).add_done_callback(
+                            log_background_failure
+                        )
+                    return value
+
+                # past the cutoff, never served again
+                values.pop(key, None)
+
+            stats[key].misses += 1
+            # shield the shared refresh from callers being cancelled
+            return await asyncio.shield(refresh(key, args, kwargs))
+
+        def cache_stats() -> Dict[Hashable, CacheStats]:
+            return {key: replace(s) for key, s in stats.items()}
+
+        def cache_clear():
+            values.clear()
+            stats.clear()
+
+        wrapper.cache_stats = cache_stats
+        wrapper.cache_clear = cache_clear
+
+        return wrapper
+
+    return decorator
+
+
+class BatchCache:
+    """Per key cache that fills misses in batches
+
+    Callers ask for any set of keys: fresh entries come back right away, stale
+    ones are served while being refreshed and only missing keys are waited for.
+    Misses and stale keys are fetched together with a single `fetch_many` call.
+    """
+
+    def __init__(
+        self,
+        fetch_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        ttl_seconds: int,
+        max_stale_seconds: int,
+    ):
+        """Create batch cache
+
+        Args:
+            fetch_many (Callable): coroutine function fetching values for many keys
+            ttl_seconds (int): how long a value is considered fresh
+            max_stale_seconds (int): hard cutoff for serving stale values
+        """
+        self.fetch_many = fetch_many
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.values: Dict[Hashable, Tuple[Any, float]] = {}
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = CacheStats()
+
+    @property
+    def hit_ratio(self) -> float:
+        hits = self.stats.hits + self.stats.stale_hits
+        total = hits + self.stats.misses
+        return hits / total if total else 0
+
+    async def _fill(self, keys: List[Hashable]):
+        started_at = time.monotonic()
+        try:
+            values = await self.fetch_many(keys)
+        except Exception:
+            self.stats.refresh_errors += 1
+            raise
+        finally:
+            for key in keys:
+                self.in_flight.pop(key, None)
+
+        now = time.monotonic()
+        # drop values too old to ever be served again (e.g. prices at past blocks)
+        expired = [
+            key
+            for key, (_, fetched_at) in self.values.items()
+            if now - fetched_at > self.max_stale_seconds and key not in self.in_flight
+        ]
+        for key in expired:
+            del self.values[key]
+        for key, value in values.items():
+            self.values[key] = (value, now)
+
+        elapsed = now - started_at
+        self.stats.refreshes += 1
+        self.stats.last_refresh_seconds = elapsed
+        self.stats.total_refresh_seconds += elapsed
+
+    def _log_background_failure(self, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            LOGGER.error(f"Background batch refresh failed with {task.exception()}")
+
+    async def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Get values for keys, fetching the missing ones in one batch
+
+        Args:
+            keys (Iterable[Hashable]): keys to get values for
+
+        Returns:
+            Dict[Hashable, Any]: values by key
+        """
+        now = time.monotonic()
+        result, waiting, stale = {}, [], []
+
+        for key in dict.fromkeys(keys):
+            cached = self.values.get(key)
+            age = now - cached[1] if cached is not None else None
+
+            if cached is not None and age < self.ttl_seconds:
+                self.stats.hits += 1
+                result[key] = cached[0]
+            elif cached is not None and age < self.max_stale_seconds:
+                self.stats.stale_hits += 1
+                result[key] = cached[0]
+                stale.append(key)
+            else:
+                self.stats.misses += 1
+                waiting.append(key)
+                # past the cutoff, never served again
+                self.values.pop(key, None)
+
+        # misses and stale keys go out together, unless already being fetched
+        to_fetch = [key for key in waiting + stale if key not in self.in_flight]
+        if to_fetch:
+            fill = shared_future(self._fill(to_fetch))
+            fill.add_done_callback(self._log_background_failure)
+            for key in to_fetch:
+                self.in_flight[key] = fill
+
+        fills = {self.in_flight[key] for key in waiting if key in self.in_flight}
+        errors = await asyncio.gather(
+            *map(asyncio.shield, fills), return_exceptions=True
+        )
+
+        for key in waiting:
+            if key in self.values:
+                result[key] = self.values[key][0]
+            else:
+                raise next(filter(None, errors), KeyError(key))
+
+        return result
@@ -0,0 +1,193 @@
+import functools
+
+from dataclasses import dataclass
+from eth_abi import encode
+from eth_abi.exceptions import InsufficientDataBytes
+from eth_abi.grammar import ABIType, BasicType, TupleType, parse
+from eth_utils import function_abi_to_4byte_selector
+from eth_utils.abi import collapse_if_tuple
+from typing import Any, Callable, Dict, List, Tuple
+
+from .helpers import load_local_abi
+
+# calldata encodings kept per view, covers static and paging arguments
+CALLDATA_CACHE_SIZE = 1024
+
+# (data, start of the value's encoding) => value
+Decoder = Callable[[bytes, int], Any]
+
+
+def _read(data: bytes, offset: int, size: int) -> bytes:
+    # slicing past the end would quietly come back short (empty data decoding
+    # to nothing at all), raise like eth_abi does instead
+    if offset + size > len(data):
+        raise InsufficientDataBytes(
+            f"Tried to read {size} bytes at {offset}, only got {len(data)} bytes"
+        )
+    return data[offset : offset + size]
+
+
+def _word(data: bytes, offset: int) -> int:
+    return int.from_bytes(_read(data, offset, 32), "big")
+
+
+def _basic(abi_type: BasicType) -> Decoder:
+    if abi_type.base == "uint":
+        return _word
+    if abi_type.base == "int":
+        return lambda data, offset: int.from_bytes(
+            _read(data, offset, 32), "big", signed=True
+        )
+    if abi_type.base == "address":
+        return lambda data, offset: "0x" + _read(data, offset, 32)[12:].hex()
+    if abi_type.base == "bool":
+        return lambda data, offset: _word(data, offset) != 0
+    if abi_type.base == "bytes" and abi_type.is_dynamic:
+        return lambda data, offset: _read(data, offset + 32, _word(data, offset))
+    if abi_type.base == "string":
+        return lambda data, offset: _read(
+            data, offset + 32, _word(data, offset)
+        ).decode("utf-8")
+    raise ValueError(f"Unsupported ABI type {abi_type.to_type_str()}")
+
+
+def _tuple(components: List[ABIType]) -> Decoder:
+    # head offset, decoder and whether the head holds a pointer, per component
+    layout = []
+    head = 0
+    for component in components:
+        layout.append((head, _compile(component), component.is_dynamic))
+        head += 32 if component.is_dynamic else _head_size(component)
+
+    def decode(data: bytes, offset: int) -> Tuple:
+        return tuple(
+            fn(data, offset + _word(data, offset + head) if dynamic else offset + head)
+            for head, fn, dynamic in layout
+        )
+
+    return decode
+
+
+def _array(item_type: ABIType) -> Decoder:
+    fn = _compile(item_type)
+
+    if item_type.is_dynamic:
+
+        def decode(data: bytes, offset: int) -> Tuple:
+            base = offset + 32
+            return tuple(
+                fn(data, base + _word(data, base + 32 * i))
+                for i in range(_word(data, offset))
+            )
+
+    else:
+        size = _head_size(item_type)
+
+        def decode(data: bytes, offset: int) -> Tuple:
+            base = offset + 32
+            return tuple(fn(data, base + size * i) for i in range(_word(data, offset)))
+
+    return decode
+
+
+def _head_size(abi_type: ABIType) -> int:
+    if isinstance(abi_type, TupleType):
+        return sum(map(_head_size, abi_type.components))
+    return 32
+
+
+def _compile(abi_type: ABIType) -> Decoder:
+    if abi_type.arrlist:
+        if abi_type.arrlist[-1]:
+            raise ValueError(f"Unsupported ABI type {abi_type.to_type_str()}")
+        return _array(abi_type.item_type)
+    if isinstance(abi_type, TupleType):
+        return _tuple(abi_type.components)
+    return _basic(abi_type)
+
+
+def compile_decoder(types: List[str]) -> Callable[[bytes], Tuple]:
+    """Build a decoder for ABI encoded values of given types
+
+    Same results as eth_abi's decode for the types Sugar and the oracle use
+    (dynamic arrays, tuples, ints, addresses, bools, bytes and strings),
+    without its per call type lookups and validation.
+
+    Args:
+        types (List[str]): ABI types, e.g. ["(address,uint256)[]"]
+
+    Returns:
+        Callable[[bytes], Tuple]: data => decoded values
+    """
+    decode = _tuple(list(map(parse, types)))
+    return lambda data: decode(data, 0)
+
+
+class ContractView:
+    """Contract view with its selector, calldata encoding and result decoder
+    worked out once, instead of per call through web3's contract machinery
+
+    The ABI gets read and compiled on first use, not when the view is declared.
+    """
+
+    def __init__(self, address: str, abi_path: str, name: str):
+        self.address = address
+        self.abi_path = abi_path
+        self.name = name
+        self.calldata = functools.lru_cache(maxsize=CALLDATA_CACHE_SIZE)(self._calldata)
+
+    def __repr__(self) -> str:
+        return f"ContractView({self.name} at {self.address})"
+
+    def __call__(self, *args) -> "ViewCall":
+        return ViewCall(view=self, data=self.calldata(*args))
+
+    @functools.cached_property
+    def fn_abi(self) -> Dict:
+        [fn_abi] = filter(
+            lambda e: e.get("type") == "function" and e.get("name") == self.name,
+            load_local_abi(self.abi_path),
+        )
+        return fn_abi
+
+    @functools.cached_property
+    def selector(self) -> bytes:
+        return function_abi_to_4byte_selector(self.fn_abi)
+
+    @functools.cached_property
+    def input_types(self) -> List[str]:
+        return list(map(collapse_if_tuple, self.fn_abi["inputs"]))
+
+    @functools.cached_property
+    def _decoder(self) -> Tuple[Callable[[bytes], Tuple], bool]:
+        output_types = list(map(collapse_if_tuple, self.fn_abi["outputs"]))
+        return compile_decoder(output_types), len(output_types) == 1
+
+    def _calldata(self, *args) -> str:
+        return "0x" + (self.selector + encode(self.input_types, args)).hex()
+
+    def decode(self, data: bytes) -> Any:
+        """Decode view result, unwrapped when there is a single output
+
+        Args:
+            data (bytes): raw eth_call result
+
+        Returns:
+            Any: decoded result, arrays and structs come back as tuples
+        """
+        decode, single_output = self._decoder
+        decoded = decode(data)
+        return decoded[0] if single_output else decoded
+
+
+@dataclass(frozen=True)
+class ViewCall:
+    view: ContractView
+    data: str
+
+    @property
+    def address(self) -> str:
+        return self.view.address
+
+    def decode(self, data: bytes) -> Any:
+        return self.view.decode(data)
@@ -0,0 +1,180 @@
+import numpy as np
+
+from dataclasses import dataclass, fields
+from functools import cached_property
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+from .data import LiquidityPool, Price, Token
+from .helpers import addresses
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def _field(pool_tuples: Sequence[Tuple], position: int) -> np.ndarray:
+    return np.fromiter(
+        map(lambda t: t[position], pool_tuples),
+        dtype=np.float64,
+        count=len(pool_tuples),
+    )
+
+
+def _token_fields(
+    pool_tuples: Sequence[Tuple],
+    position: int,
+    tokens: Mapping[int, Token],
+    prices: Mapping[int, Price],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Scale (10 ** -decimals) and price of the token at given Sugar tuple
+    position, for each pool; zeros for unlisted or unpriced tokens, same as
+    the object API leaving their amounts out"""
+
+    def lookup(address: str) -> Tuple[float, float]:
+        address_id = addresses.find(address)
+        token, price = tokens.get(address_id), prices.get(address_id)
+        if token is None or price is None:
+            return 0.0, 0.0
+        return 10.0**-token.decimals, price.price
+
+    # a few hundred tokens across all the pools, look each one up once
+    by_address = {
+        address: lookup(address)
+        for address in set(map(lambda t: t[position], pool_tuples))
+    }
+    looked_up = list(map(lambda t: by_address[t[position]], pool_tuples))
+    return _field(looked_up, 0), _field(looked_up, 1)
+
+
+def _divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # x / 0 => 0, same as the object API
+    return np.divide(a, b, out=np.zeros_like(a), where=b != 0)
+
+
+@dataclass(frozen=True)
+class PoolColumns:
+    """Pools laid out as one array per field, same order as the pools they
+    were built from, so metrics across all pools are vectorized expressions
+
+    Missing amounts (unlisted tokens) are zeros.
+    """
+
+    # address id => row
+    rows: Dict[int, int]
+    reserve0: np.ndarray
+    reserve1: np.ndarray
+    price0: np.ndarray
+    price1: np.ndarray
+    fees0: np.ndarray
+    fees1: np.ndarray
+    emissions: np.ndarray
+    emissions_price: np.ndarray
+    gauge_total_supply: np.ndarray
+    total_supply: np.ndarray
+    pool_fee: np.ndarray
+
+    @classmethod
+    def from_pools(
+        cls,
+        pools: Sequence[LiquidityPool],
+        tokens: Mapping[int, Token],
+        prices: Mapping[int, Price],
+    ) -> "PoolColumns":
+        """Columns read straight off the raw Sugar tuples, building no
+        Amounts on the way (see LiquidityPool for tuple positions)
+
+        Args:
+            pools (Sequence[LiquidityPool]): pools
+            tokens (Mapping[int, Token]): listed tokens by address id
+            prices (Mapping[int, Price]): prices by token address id
+
+        Returns:
+            PoolColumns: columns, one row per pool
+        """
+        pool_tuples = list(map(lambda p: p.to_tuple(), pools))
+        scale0, price0 = _token_fields(pool_tuples, 7, tokens, prices)
+        scale1, price1 = _token_fields(pool_tuples, 10, tokens, prices)
+        emissions_scale, emissions_price = _token_fields(
+            pool_tuples, 20, tokens, prices
+        )
+
+        return PoolColumns(
+            rows={pool.lp_id: i for i, pool in enumerate(pools)},
+            reserve0=_field(pool_tuples, 8) * scale0,
+            reserve1=_field(pool_tuples, 11) * scale1,
+            price0=price0,
+            price1=price1,
+            fees0=_field(pool_tuples, 23) * scale0,
+            fees1=_field(pool_tuples, 24) * scale1,
+            emissions=_field(pool_tuples, 19) * emissions_scale,
+            emissions_price=emissions_price,
+            gauge_total_supply=_field(pool_tuples, 14),
+            total_supply=_field(pool_tuples, 3),
+            pool_fee=_field(pool_tuples, 21),
+        )
+
+    @classmethod
+    def from_array(
+        cls, pools: Sequence[LiquidityPool], array: np.ndarray
+    ) -> "PoolColumns":
+        """Columns over an array made by to_array, without copying it
+
+        Args:
+            pools (Sequence[LiquidityPool]): pools the array was built from
+            array (np.ndarray): one row per field
+
+        Returns:
+            PoolColumns: columns viewing the array rows
+        """
+        return PoolColumns(
+            rows={pool.lp_id: i for i, pool in enumerate(pools)},
+            **dict(zip(ARRAY_FIELDS, array, strict=True)),
+        )
+
+    def to_array(self) -> np.ndarray:
+        return np.stack(list(map(lambda name: getattr(self, name), ARRAY_FIELDS)))
+
+    def row(self, address: str) -> Optional[int]:
+        address_id = addresses.find(address)
+        return self.rows.get(address_id) if address_id is not None else None
+
+    @cached_property
+    def tvl(self) -> np.ndarray:
+        return self.reserve0 * self.price0 + self.reserve1 * self.price1
+
+    @cached_property
+    def fees(self) -> np.ndarray:
+        return self.fees0 * self.price0 + self.fees1 * self.price1
+
+    @cached_property
+    def volume(self) -> np.ndarray:
+        # see LiquidityPool.volume_pct
+        return (
+            _divide(np.full_like(self.pool_fee, 100 * 100), self.pool_fee) * self.fees
+        )
+
+    @cached_property
+    def staked_pct(self) -> np.ndarray:
+        return _divide(100 * self.gauge_total_supply, self.total_supply)
+
+    @cached_property
+    def apr(self) -> np.ndarray:
+        reward = self.emissions * self.emissions_price * DAY_SECONDS
+        staked_tvl = self.tvl * self.staked_pct / 100
+        return _divide(reward, staked_tvl) * (100 * 365)
+
+    @property
+    def total_tvl(self) -> float:
+        return float(self.tvl.sum())
+
+    @property
+    def total_fees(self) -> float:
+        return float(self.fees.sum())
+
+    @property
+    def total_volume(self) -> float:
+        return float(self.volume.sum())
+
+
+# PoolColumns fields holding arrays, in to_array row order
+ARRAY_FIELDS = list(
+    filter(lambda name: name != "rows", map(lambda f: f.name, fields(PoolColumns)))
+)
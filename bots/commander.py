@@ -1,6 +1,13 @@
-from .data import LiquidityPool, LiquidityPoolEpoch
-from .helpers import is_address
-from .ui import PoolsDropdown, PoolStats
+import asyncio
+
+from typing import List
+
+from .data import LiquidityPool
+from .snapshot import snapshots
+from .helpers import LOGGER, is_address
+from .metrics import StageTimings
+from .settings import COMMAND_TIMINGS_WINDOW
+from .ui import PoolsDropdown, PoolStats, emojis_cache
 
 import discord
 from discord.ext import commands
@@ -19,11 +26,20 @@ class _CommanderBot(commands.Bot):
         print("------")
         await bot.tree.sync()
 
+    async def on_guild_emojis_update(self, guild, before, after):
+        # rendered UI picked up the old emojis
+        emojis_cache.invalidate()
+
 
 bot = _CommanderBot()
 
+# /pool latency by stage, e.g. pool_timings.percentiles(99)
+pool_timings = StageTimings(COMMAND_TIMINGS_WINDOW)
+
 
 def CommanderBot() -> commands.Bot:
+    # /pool searches snapshot pools, have them indexed upfront
+    snapshots.index_search = True
     # keep our commander as a singleton
     return bot
 
@@ -38,18 +54,67 @@ async def on_select_pool(
         interaction (discord.Interaction): chat interaction
         address_or_pool (str | LiquidityPool): pool address or instance
     """
-    pool = (
-        await LiquidityPool.by_address(address_or_pool)
-        if isinstance(address_or_pool, str)
-        else address_or_pool
-    )
-    tvl = await LiquidityPool.tvl([pool])
-    pool_epoch = await LiquidityPoolEpoch.fetch_for_pool(pool.lp)
-    await interaction.response.send_message(
-        embed=await PoolStats(interaction.client.emojis).render(pool, tvl, pool_epoch)
+
+    async def defer():
+        with pool_timings.stage("defer"):
+            if not interaction.response.is_done():
+                await interaction.response.defer(thinking=True)
+
+    async def get_snapshot():
+        with pool_timings.stage("snapshot"):
+            return await snapshots.get()
+
+    with pool_timings.stage("total"):
+        # acknowledge right away so a cold snapshot can't blow Discord's
+        # 3 second deadline, while the snapshot loads
+        _, snapshot = await asyncio.gather(defer(), get_snapshot())
+
+        with pool_timings.stage("render"):
+            snapshot_key = snapshot.key
+            if isinstance(address_or_pool, str):
+                pool = snapshot.pool(address_or_pool)
+            else:
+                # selected from an earlier snapshot maybe, render the current one
+                pool = snapshot.pool(address_or_pool.lp)
+                if pool is None:
+                    # gone since, not to be cached as part of current snapshot
+                    pool, snapshot_key = address_or_pool, None
+            # per pool metrics come precomputed with the snapshot columns
+            metrics = snapshot.pool_metrics(pool.lp) if snapshot_key else None
+            if metrics is None:
+                tvl = await LiquidityPool.tvl([pool])
+                apr = pool.apr(tvl)
+            else:
+                tvl, apr = metrics
+            pool_epoch = snapshot.epoch_for_pool(pool.lp)
+            embed = await PoolStats(interaction.client.emojis).render(
+                pool, tvl, pool_epoch, snapshot_key, apr
+            )
+
+        with pool_timings.stage("reply"):
+            await reply(interaction, embed=embed)
+
+    LOGGER.debug(
+        "/pool p99 "
+        + ", ".join(
+            f"{stage} {seconds * 1000:.0f}ms"
+            for stage, seconds in pool_timings.percentiles(99).items()
+        )
     )
 
 
+async def reply(interaction: discord.Interaction, **kwargs):
+    """Respond to interaction, with a followup if it was deferred
+
+    Args:
+        interaction (discord.Interaction): chat interaction
+    """
+    if interaction.response.is_done():
+        await interaction.followup.send(**kwargs)
+    else:
+        await interaction.response.send_message(**kwargs)
+
+
 @bot.tree.command(name="pool", description="Get data for specific pool")
 @discord.app_commands.describe(
     address_or_query="Pool address or search query",
@@ -61,22 +126,29 @@ async def pool(interaction: discord.Interaction, address_or_query: str):
         interaction (discord.Interaction): chat interaction
         address_or_query (str): command input
     """
+    if snapshots.current is None:
+        # first snapshot still needs building
+        await interaction.response.defer(thinking=True)
+
+    snapshot = await snapshots.get()
+
     if is_address(address_or_query):
         # if /pool receives specific pool address,
         # show the pool immediately or show an error
         # message if it does not exist
 
-        pool = await LiquidityPool.by_address(address_or_query)
+        pool = snapshot.pool(address_or_query)
 
         if pool is not None:
             await on_select_pool(interaction, pool)
         else:
-            await interaction.response.send_message(
-                f"No pool found with this address: {address_or_query}"
+            await reply(
+                interaction,
+                content=f"No pool found with this address: {address_or_query}",
             )
         return
 
-    pools = await LiquidityPool.search(address_or_query)
+    pools = snapshot.search(address_or_query)
 
     if len(pools) == 1:
         # got exact match, show the pool
@@ -84,9 +156,39 @@ async def pool(interaction: discord.Interaction, address_or_query: str):
         return
 
     # search returned several pools, show them in a dropdown
-    await interaction.response.send_message(
-        "Choose a pool:",
+    await reply(
+        interaction,
+        content="Choose a pool:",
         view=PoolsDropdown(
             interaction=interaction, pools=pools, callback=on_select_pool
         ),
     )
+
+
+@pool.autocomplete("address_or_query")
+async def pool_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> List[discord.app_commands.Choice[str]]:
+    """Suggest pools while the user is typing
+
+    Answers from the in-memory snapshot only, never hitting RPC,
+    so it stays well within Discord's autocomplete deadline
+
+    Args:
+        interaction (discord.Interaction): chat interaction
+        current (str): what the user typed so far
+
+    Returns:
+        List[discord.app_commands.Choice[str]]: pool suggestions
+    """
+    snapshot = snapshots.current
+
+    if snapshot is None:
+        return []
+
+    return list(
+        map(
+            lambda p: discord.app_commands.Choice(name=p.symbol[:100], value=p.lp),
+            snapshot.autocomplete(current),
+        )
+    )
@@ -1,29 +1,75 @@
-import functools
 import asyncio
-from thefuzz import fuzz
-from web3 import AsyncWeb3, AsyncHTTPProvider
+
+from web3 import Web3
 from web3.constants import ADDRESS_ZERO
 from dataclasses import dataclass
-from typing import Tuple, List, Dict, Optional
+from typing import Tuple, List, Dict, Optional, ClassVar, Sequence, Set
+from web3.types import BlockIdentifier
 
 from .settings import (
-    WEB3_PROVIDER_URI,
     LP_SUGAR_ADDRESS,
-    LP_SUGAR_ABI,
+    LP_SUGAR_ABI_PATH,
     PRICE_ORACLE_ADDRESS,
-    PRICE_ORACLE_ABI,
+    PRICE_ORACLE_ABI_PATH,
     CONNECTOR_TOKENS_ADDRESSES,
     STABLE_TOKEN_ADDRESS,
     SUGAR_TOKENS_CACHE_MINUTES,
     SUGAR_LPS_CACHE_MINUTES,
     ORACLE_PRICES_CACHE_MINUTES,
+    CACHE_MAX_STALE_MINUTES,
+    CACHE_MAX_BLOCKS,
     PRICE_BATCH_SIZE,
     GOOD_ENOUGH_PAGINATION_LIMIT,
     POOL_PAGE_SIZE,
+    POOL_PAGE_CONCURRENCY,
+    POOL_LOGS_ADDRESS_BATCH,
+)
+from .helpers import addresses, chunk, paginate, run_in_worker, AddressIndexed
+from .cache import cache_stale_while_revalidate, BatchCache
+from .codec import ContractView
+from .rpc import batch_call, call_in_thread, get_logs_in_thread
+
+# hot Sugar and oracle views, see codec.ContractView
+SUGAR_TOKENS = ContractView(LP_SUGAR_ADDRESS, LP_SUGAR_ABI_PATH, "tokens")
+SUGAR_ALL = ContractView(LP_SUGAR_ADDRESS, LP_SUGAR_ABI_PATH, "all")
+SUGAR_BY_INDEX = ContractView(LP_SUGAR_ADDRESS, LP_SUGAR_ABI_PATH, "byIndex")
+SUGAR_EPOCHS_LATEST = ContractView(LP_SUGAR_ADDRESS, LP_SUGAR_ABI_PATH, "epochsLatest")
+ORACLE_RATES = ContractView(
+    PRICE_ORACLE_ADDRESS, PRICE_ORACLE_ABI_PATH, "getManyRatesWithConnectors"
 )
-from .helpers import cache_in_seconds, normalize_address, chunk
 
-w3 = AsyncWeb3(AsyncHTTPProvider(WEB3_PROVIDER_URI))
+# pool events touching reserves or fees, for basic and concentrated pools
+POOL_EVENT_TOPICS = list(
+    map(
+        lambda signature: Web3.keccak(text=signature).hex(),
+        [
+            "Sync(uint256,uint256)",
+            "Swap(address,address,uint256,uint256,uint256,uint256)",
+            "Mint(address,uint256,uint256)",
+            "Burn(address,address,uint256,uint256)",
+            "Fees(address,uint256,uint256)",
+            "Swap(address,address,int256,int256,uint160,uint128,int24)",
+            "Mint(address,address,int24,int24,uint128,uint256,uint256)",
+            "Burn(address,int24,int24,uint128,uint256,uint256)",
+            "Collect(address,address,int24,int24,uint128,uint128)",
+        ],
+    )
+)
+
+# gauge events touching staked liquidity or emissions, for basic and
+# concentrated pool gauges
+GAUGE_EVENT_TOPICS = list(
+    map(
+        lambda signature: Web3.keccak(text=signature).hex(),
+        [
+            "Deposit(address,address,uint256)",
+            "Withdraw(address,uint256)",
+            "NotifyReward(address,uint256)",
+            "Deposit(address,uint256,uint128)",
+            "Withdraw(address,uint256,uint128)",
+        ],
+    )
+)
 
 
 @dataclass(frozen=True)
@@ -34,11 +80,16 @@ class Token:
     https://github.com/velodrome-finance/sugar/blob/v2/contracts/LpSugar.vy#L17
     """
 
-    token_address: str
+    # interned address, see helpers.AddressTable
+    token_id: int
     symbol: str
     decimals: int
     listed: bool
 
+    @property
+    def token_address(self) -> str:
+        return addresses.checksum(self.token_id)
+
     def value_from_bigint(self, value: float) -> float:
         return value / 10**self.decimals
 
@@ -46,26 +97,42 @@ class Token:
     def from_tuple(cls, t: Tuple) -> "Token":
         (token_address, symbol, decimals, _, listed) = t
         return Token(
-            token_address=normalize_address(token_address),
+            token_id=addresses.id(token_address),
             symbol=symbol,
             decimals=decimals,
             listed=listed,
         )
 
     @classmethod
-    @cache_in_seconds(SUGAR_TOKENS_CACHE_MINUTES * 60)
-    async def get_all_listed_tokens(cls) -> List["Token"]:
-        tokens = await cls.get_all_tokens()
-        return list(filter(lambda t: t.listed, tokens))
+    @cache_stale_while_revalidate(
+        SUGAR_TOKENS_CACHE_MINUTES * 60,
+        CACHE_MAX_STALE_MINUTES * 60,
+        maxsize=CACHE_MAX_BLOCKS,
+    )
+    async def get_all_listed_tokens(
+        cls, block_identifier: BlockIdentifier = "latest"
+    ) -> AddressIndexed:
+        tokens = await cls.get_all_tokens(block_identifier)
+        return AddressIndexed(
+            filter(lambda t: t.listed, tokens), key=lambda t: t.token_id
+        )
 
     @classmethod
-    @cache_in_seconds(SUGAR_TOKENS_CACHE_MINUTES * 60)
-    async def get_all_tokens(cls) -> List["Token"]:
-        sugar = w3.eth.contract(address=LP_SUGAR_ADDRESS, abi=LP_SUGAR_ABI)
-        tokens = await sugar.functions.tokens(
-            GOOD_ENOUGH_PAGINATION_LIMIT, 0, ADDRESS_ZERO, []
-        ).call()
-        return list(map(lambda t: Token.from_tuple(t), tokens))
+    @cache_stale_while_revalidate(
+        SUGAR_TOKENS_CACHE_MINUTES * 60,
+        CACHE_MAX_STALE_MINUTES * 60,
+        maxsize=CACHE_MAX_BLOCKS,
+    )
+    async def get_all_tokens(
+        cls, block_identifier: BlockIdentifier = "latest"
+    ) -> AddressIndexed:
+        return await call_in_thread(
+            SUGAR_TOKENS(GOOD_ENOUGH_PAGINATION_LIMIT, 0, ADDRESS_ZERO, ()),
+            block_identifier,
+            lambda tokens: AddressIndexed(
+                map(lambda t: Token.from_tuple(t), tokens), key=lambda t: t.token_id
+            ),
+        )
 
     @classmethod
     async def get_by_token_address(cls, token_address: str) -> Optional["Token"]:
@@ -77,12 +144,8 @@ class Token:
         Returns:
             Token: target token or None
         """
-        try:
-            normalized_address = normalize_address(token_address)
-            tokens = await cls.get_all_listed_tokens()
-            return next(t for t in tokens if t.token_address == normalized_address)
-        except Exception:
-            return None
+        tokens = await cls.get_all_listed_tokens()
+        return tokens.by_address(token_address)
 
 
 @dataclass(frozen=True)
@@ -96,18 +159,20 @@ class Amount:
         cls,
         address: str,
         amount: float,
-        tokens: Dict[str, Token],
-        prices: Dict[str, "Price"],
+        tokens: Dict[int, Token],
+        prices: Dict[int, "Price"],
     ) -> "Amount":
-        address = normalize_address(address)
+        address_id = addresses.id(address)
 
-        if address not in tokens or address not in prices:
+        if address_id not in tokens or address_id not in prices:
             return None
 
-        token = tokens[address]
+        token = tokens[address_id]
 
         return Amount(
-            token=token, amount=token.value_from_bigint(amount), price=prices[address]
+            token=token,
+            amount=token.value_from_bigint(amount),
+            price=prices[address_id],
         )
 
     @property
@@ -130,222 +195,444 @@ class Price:
     def pretty_price(self) -> float:
         return round(self.price, 5)
 
+    # per token price stores, one for each (stable token, connectors) pricing setup
+    _stores: ClassVar[Dict[Tuple[str, Tuple[str]], BatchCache]] = {}
+
     @classmethod
-    @cache_in_seconds(ORACLE_PRICES_CACHE_MINUTES * 60)
-    async def _get_prices(
-        cls, tokens: Tuple[Token], stable_token: str, connector_tokens: Tuple[str]
-    ):
-        price_oracle = w3.eth.contract(
-            address=PRICE_ORACLE_ADDRESS, abi=PRICE_ORACLE_ABI
-        )
-        pricing_token_list = (
-            list(map(lambda t: t.token_address, tokens))
-            + list(connector_tokens)
-            + [stable_token]
-        )
-        prices = await price_oracle.functions.getManyRatesWithConnectors(
-            len(tokens), pricing_token_list
-        ).call()
+    async def _fetch_prices(
+        cls,
+        tokens: List[Token],
+        stable_token: str,
+        connector_tokens: Tuple[str],
+        block_identifier: BlockIdentifier,
+    ) -> Dict[Token, "Price"]:
+        batches = list(chunk(tokens, PRICE_BATCH_SIZE))
+        calls = []
+
+        for batch in batches:
+            pricing_token_list = (
+                tuple(map(lambda t: t.token_address, batch))
+                + tuple(connector_tokens)
+                + (stable_token,)
+            )
+            calls.append(
+                (
+                    PRICE_ORACLE_ADDRESS,
+                    ORACLE_RATES.calldata(len(batch), pricing_token_list),
+                )
+            )
+
+        # all the chunks go out in a single JSON-RPC batch request
+        responses = await batch_call(calls, block_identifier)
 
-        results = []
+        results = {}
 
-        for cnt, price in enumerate(prices):
-            # XX: decimals are auto set to 18, see
-            # https://github.com/velodrome-finance/oracle/blob/main/contracts/VeloOracle.sol#L126
-            results.append(Price(token=tokens[cnt], price=price / 10**18))
+        for batch, response in zip(batches, responses, strict=True):
+            prices = ORACLE_RATES.decode(response)
+            for cnt, price in enumerate(prices):
+                # XX: decimals are auto set to 18, see
+                # https://github.com/velodrome-finance/oracle/blob/main/contracts/VeloOracle.sol#L126
+                results[batch[cnt]] = Price(token=batch[cnt], price=price / 10**18)
 
         return results
 
+    @classmethod
+    def price_store(cls, stable_token: str, connector_tokens: Tuple[str]) -> BatchCache:
+        """Get per token price store for given pricing setup
+
+        Args:
+            stable_token (str): stable token to price in
+            connector_tokens (Tuple[str]): connector tokens to use for pricing
+
+        Returns:
+            BatchCache: price store, see its stats and hit_ratio for metrics
+        """
+        key = (stable_token, connector_tokens)
+
+        async def fetch_many(keys: List[Tuple[Token, BlockIdentifier]]) -> Dict:
+            # keys requested together share their block
+            block_identifier = keys[0][1]
+            prices = await cls._fetch_prices(
+                list(map(lambda k: k[0], keys)),
+                stable_token,
+                connector_tokens,
+                block_identifier,
+            )
+            return {(t, block_identifier): p for t, p in prices.items()}
+
+        if key not in cls._stores:
+            cls._stores[key] = BatchCache(
+                fetch_many,
+                ORACLE_PRICES_CACHE_MINUTES * 60,
+                CACHE_MAX_STALE_MINUTES * 60,
+            )
+        return cls._stores[key]
+
     @classmethod
     async def get_prices(
         cls,
         tokens: List[Token],
         stable_token: str = STABLE_TOKEN_ADDRESS,
         connector_tokens: List[str] = CONNECTOR_TOKENS_ADDRESSES,
+        block_identifier: BlockIdentifier = "latest",
     ) -> List["Price"]:
         """Get prices for tokens in target stable token
 
+        Prices are cached per token and block, only tokens missing from the
+        cache get priced by the oracle.
+
         Args:
             tokens (List[Token]): tokens to get prices for
             stable_token (str, optional): stable token to price in.
             Defaults to STABLE_TOKEN_ADDRESS.
             connector_tokens (List[str], optional): connector tokens to use for pricing.
             Defaults to CONNECTOR_TOKENS_ADDRESSES.
+            block_identifier (BlockIdentifier, optional): block to price at.
+            Defaults to "latest".
 
         Returns:
             List: list of Price objects
         """
-        batches = await asyncio.gather(
-            *map(
-                lambda ts: cls._get_prices(
-                    # XX: lists are not cacheable, convert them to tuples so lru cache is happy
-                    tuple(ts),
-                    stable_token,
-                    tuple(connector_tokens),
-                ),
-                list(chunk(tokens, PRICE_BATCH_SIZE)),
-            )
-        )
-        return functools.reduce(lambda l1, l2: l1 + l2, batches, [])
+        store = cls.price_store(stable_token, tuple(connector_tokens))
+        keys = list(map(lambda t: (t, block_identifier), tokens))
+        prices = await store.get_many(keys)
+        return list(map(lambda k: prices[k], keys))
 
 
-@dataclass(frozen=True)
 class LiquidityPool:
-    """Data class for Liquidity Pool
+    """Liquidity Pool record
+
+    Keeps the raw Sugar tuple and builds Token / Amount views on access,
+    so decoding a large pool set costs little more than the tuples themselves.
 
     based on:
     https://github.com/velodrome-finance/sugar/blob/v2/contracts/LpSugar.vy#L31
     """
 
-    lp: str
-    symbol: str
-    is_stable: bool
-    total_supply: float
-    decimals: int
-    token0: Token
-    reserve0: Amount
-    token1: Token
-    reserve1: Amount
-    token0_fees: Amount
-    token1_fees: Amount
-    pool_fee: float
-    gauge_total_supply: float
-    emissions: Amount
-    emissions_token: Token
-    weekly_emissions: Amount
+    # Sugar.all returns a tuple with the following structure:
+    # { "name": "lp", "type": "address" },          <== 0
+    # { "name": "symbol", "type": "string" },       <== 1
+    # { "name": "decimals", "type": "uint8" },      <== 2
+    # { "name": "liquidity", "type": "uint256" },   <== 3
+    # { "name": "type", "type": "int24" },          <== 4
+    # { "name": "tick", "type": "int24" },          <== 5
+    # { "name": "sqrt_ratio", "type": "uint160" },  <== 6
+    # { "name": "token0", "type": "address" },      <== 7
+    # { "name": "reserve0", "type": "uint256" },    <== 8
+    # { "name": "staked0", "type": "uint256" },     <== 9
+    # { "name": "token1", "type": "address" },      <== 10
+    # { "name": "reserve1", "type": "uint256" },    <== 11
+    # { "name": "staked1", "type": "uint256" },     <== 12
+    # { "name": "gauge", "type": "address" },        <== 13
+    # { "name": "gauge_liquidity", "type": "uint256" },  <== 14
+    # { "name": "gauge_alive", "type": "bool" },        <== 15
+    # { "name": "fee", "type": "address" },             <== 16
+    # { "name": "bribe", "type": "address" },           <== 17
+    # { "name": "factory", "type": "address" },         <== 18
+    # { "name": "emissions", "type": "uint256" },       <== 19
+    # { "name": "emissions_token", "type": "address" },  <== 20
+    # { "name": "pool_fee", "type": "uint256" },        <== 21
+    # { "name": "unstaked_fee", "type": "uint256" },    <== 22
+    # { "name": "token0_fees", "type": "uint256" },     <== 23
+    # { "name": "token1_fees", "type": "uint256" }     <== 24
+
+    __slots__ = ("lp_id", "_t", "_tokens", "_prices")
+
+    # number of pools seen on the last fetch, used as a pagination hint
+    _pool_count_hint: ClassVar[int] = 0
+
+    def __init__(self, t: Tuple, tokens: Dict[int, Token], prices: Dict[int, Price]):
+        self.lp_id = addresses.id(t[0])
+        self._t = t
+        # shared by all the pools of a fetch
+        self._tokens = tokens
+        self._prices = prices
+
+    def __repr__(self) -> str:
+        return f"LiquidityPool(lp={self.lp!r}, symbol={self.symbol!r})"
 
     @classmethod
     def from_tuple(
-        cls, t: Tuple, tokens: Dict[str, Token], prices: Dict[str, Price]
+        cls, t: Tuple, tokens: Dict[int, Token], prices: Dict[int, Price]
     ) -> "LiquidityPool":
-        token0 = normalize_address(t[7])
-        token1 = normalize_address(t[10])
-        token0_fees = t[23]
-        token1_fees = t[24]
-        emissions_token = normalize_address(t[20])
-        emissions = t[19]
+        return LiquidityPool(t, tokens, prices)
 
-        seconds_in_a_week = 7 * 24 * 60 * 60
+    def to_tuple(self) -> Tuple:
+        """Raw Sugar tuple the pool was built from, see from_tuple"""
+        return self._t
 
-        # Sugar.all returns a tuple with the following structure:
-        # { "name": "lp", "type": "address" },          <== 0
-        # { "name": "symbol", "type": "string" },       <== 1
-        # { "name": "decimals", "type": "uint8" },      <== 2
-        # { "name": "liquidity", "type": "uint256" },   <== 3
-        # { "name": "type", "type": "int24" },          <== 4
-        # { "name": "tick", "type": "int24" },          <== 5
-        # { "name": "sqrt_ratio", "type": "uint160" },  <== 6
-        # { "name": "token0", "type": "address" },      <== 7
-        # { "name": "reserve0", "type": "uint256" },    <== 8
-        # { "name": "staked0", "type": "uint256" },     <== 9
-        # { "name": "token1", "type": "address" },      <== 10
-        # { "name": "reserve1", "type": "uint256" },    <== 11
-        # { "name": "staked1", "type": "uint256" },     <== 12
-        # { "name": "gauge", "type": "address" },        <== 13
-        # { "name": "gauge_liquidity", "type": "uint256" },  <== 14
-        # { "name": "gauge_alive", "type": "bool" },        <== 15
-        # { "name": "fee", "type": "address" },             <== 16
-        # { "name": "bribe", "type": "address" },           <== 17
-        # { "name": "factory", "type": "address" },         <== 18
-        # { "name": "emissions", "type": "uint256" },       <== 19
-        # { "name": "emissions_token", "type": "address" },  <== 20
-        # { "name": "pool_fee", "type": "uint256" },        <== 21
-        # { "name": "unstaked_fee", "type": "uint256" },    <== 22
-        # { "name": "token0_fees", "type": "uint256" },     <== 23
-        # { "name": "token1_fees", "type": "uint256" }     <== 24
-
-        return LiquidityPool(
-            lp=normalize_address(t[0]),
-            symbol=t[1],
-            # stable pools have type set to 0
-            is_stable=t[4] == 0,
-            total_supply=t[3],
-            decimals=t[2],
-            token0=tokens.get(token0),
-            reserve0=Amount.build(token0, t[8], tokens, prices),
-            token1=tokens.get(token1),
-            reserve1=Amount.build(token1, t[11], tokens, prices),
-            token0_fees=Amount.build(token0, token0_fees, tokens, prices),
-            token1_fees=Amount.build(token1, token1_fees, tokens, prices),
-            pool_fee=t[21],
-            gauge_total_supply=t[14],
-            emissions_token=tokens.get(emissions_token),
-            emissions=Amount.build(emissions_token, emissions, tokens, prices),
-            weekly_emissions=Amount.build(
-                emissions_token, emissions * seconds_in_a_week, tokens, prices
-            ),
-        )
+    @staticmethod
+    def _lookup(mapping: Dict, address: str):
+        return mapping.get(addresses.id(address))
+
+    @property
+    def lp(self) -> str:
+        return addresses.checksum(self.lp_id)
+
+    def _amount(self, address: str, amount: float) -> Optional[Amount]:
+        token = self._lookup(self._tokens, address)
+        price = self._lookup(self._prices, address)
+        if token is None or price is None:
+            return None
+        return Amount(token=token, amount=token.value_from_bigint(amount), price=price)
+
+    @property
+    def symbol(self) -> str:
+        return self._t[1]
+
+    @property
+    def is_stable(self) -> bool:
+        # stable pools have type set to 0
+        return self._t[4] == 0
+
+    @property
+    def total_supply(self) -> float:
+        return self._t[3]
+
+    @property
+    def decimals(self) -> int:
+        return self._t[2]
+
+    @property
+    def token0(self) -> Optional[Token]:
+        return self._lookup(self._tokens, self._t[7])
+
+    @property
+    def reserve0(self) -> Optional[Amount]:
+        return self._amount(self._t[7], self._t[8])
+
+    @property
+    def token1(self) -> Optional[Token]:
+        return self._lookup(self._tokens, self._t[10])
+
+    @property
+    def reserve1(self) -> Optional[Amount]:
+        return self._amount(self._t[10], self._t[11])
+
+    @property
+    def token0_fees(self) -> Optional[Amount]:
+        return self._amount(self._t[7], self._t[23])
+
+    @property
+    def token1_fees(self) -> Optional[Amount]:
+        return self._amount(self._t[10], self._t[24])
+
+    @property
+    def pool_fee(self) -> float:
+        return self._t[21]
+
+    @property
+    def gauge(self) -> Optional[str]:
+        return self._t[13] if self._t[13].lower() != ADDRESS_ZERO else None
+
+    @property
+    def gauge_total_supply(self) -> float:
+        return self._t[14]
+
+    @property
+    def emissions(self) -> Optional[Amount]:
+        return self._amount(self._t[20], self._t[19])
+
+    @property
+    def emissions_token(self) -> Optional[Token]:
+        return self._lookup(self._tokens, self._t[20])
+
+    @property
+    def weekly_emissions(self) -> Optional[Amount]:
+        seconds_in_a_week = 7 * 24 * 60 * 60
+        return self._amount(self._t[20], self._t[19] * seconds_in_a_week)
 
     @classmethod
-    @cache_in_seconds(SUGAR_LPS_CACHE_MINUTES * 60)
-    async def get_pools(cls) -> List["LiquidityPool"]:
-        tokens = await Token.get_all_listed_tokens()
-        prices = await Price.get_prices(tokens)
+    @cache_stale_while_revalidate(
+        SUGAR_LPS_CACHE_MINUTES * 60,
+        CACHE_MAX_STALE_MINUTES * 60,
+        maxsize=CACHE_MAX_BLOCKS,
+    )
+    async def get_pools(
+        cls, block_identifier: BlockIdentifier = "latest"
+    ) -> AddressIndexed:
+        """Fetch all pools, every page read at the same block
+
+        Args:
+            block_identifier (BlockIdentifier, optional): block to read at.
+            Defaults to "latest".
 
-        tokens = {t.token_address: t for t in tokens}
-        prices = {price.token.token_address: price for price in prices}
+        Returns:
+            AddressIndexed: pools indexed by address
+        """
+        tokens = await Token.get_all_listed_tokens(block_identifier)
+        prices = await Price.get_prices(tokens, block_identifier=block_identifier)
+
+        tokens = tokens.index
+        prices = {price.token.token_id: price for price in prices}
 
-        sugar = w3.eth.contract(address=LP_SUGAR_ADDRESS, abi=LP_SUGAR_ABI)
         pools = []
-        pool_offset = 0
 
-        while True:
-            pools_batch = await sugar.functions.all(POOL_PAGE_SIZE, pool_offset).call()
+        # previous pool count tells us how many pages to request upfront,
+        # pages get decoded off the loop while the next ones are still in flight
+        pages = paginate(
+            lambda limit, offset: call_in_thread(
+                SUGAR_ALL(limit, offset),
+                block_identifier,
+                lambda page: cls._decode_page(page, tokens, prices),
+            ),
+            page_size=POOL_PAGE_SIZE,
+            max_in_flight=POOL_PAGE_CONCURRENCY,
+            expected_pages=cls._pool_count_hint // POOL_PAGE_SIZE + 1,
+        )
 
+        async for pools_batch in pages:
             pools += pools_batch
 
-            if len(pools_batch) < POOL_PAGE_SIZE:
-                break
-            else:
-                pool_offset += POOL_PAGE_SIZE
+        cls._pool_count_hint = len(pools)
+
+        return AddressIndexed(pools, key=lambda p: p.lp_id)
+
+    @classmethod
+    def _decode_page(
+        cls, page: List[Tuple], tokens: Dict[int, Token], prices: Dict[int, Price]
+    ) -> List["LiquidityPool"]:
+        return list(map(lambda p: LiquidityPool.from_tuple(p, tokens, prices), page))
 
-        return list(
-            filter(
-                lambda p: p is not None,
-                map(lambda p: LiquidityPool.from_tuple(p, tokens, prices), pools),
+    @classmethod
+    async def changed_since(
+        cls, pools: AddressIndexed, from_block: int, to_block: int
+    ) -> Set[int]:
+        """Find pools with reserve, fee, staked liquidity or emissions changing
+        events (emitted by pools or their gauges) in a block range
+
+        Args:
+            pools (AddressIndexed): known pools
+            from_block (int): first block to scan
+            to_block (int): last block to scan
+
+        Returns:
+            Set[int]: address ids of known pools that changed
+        """
+        # pool address id by its own and its gauge's address id
+        owners = {pool.lp_id: pool.lp_id for pool in pools}
+        owners.update(
+            map(
+                lambda pool: (addresses.id(pool.gauge), pool.lp_id),
+                filter(lambda pool: pool.gauge is not None, pools),
+            )
+        )
+
+        def changed(logs: List[Dict]) -> Set[int]:
+            # find rather than id: nothing gets interned for unknown emitters
+            return set(
+                filter(
+                    lambda address_id: address_id is not None,
+                    map(lambda log: owners.get(addresses.find(log["address"])), logs),
+                )
             )
+
+        # filtered by address, the same events get emitted by plenty of
+        # non Velodrome contracts: more logs than providers return in one go
+        batches = await asyncio.gather(
+            *map(
+                lambda batch: get_logs_in_thread(
+                    {
+                        "fromBlock": from_block,
+                        "toBlock": to_block,
+                        "address": batch,
+                        "topics": [POOL_EVENT_TOPICS + GAUGE_EVENT_TOPICS],
+                    },
+                    changed,
+                ),
+                chunk(list(map(addresses.checksum, owners)), POOL_LOGS_ADDRESS_BATCH),
+            )
+        )
+        return set().union(*batches)
+
+    @classmethod
+    async def update_pools(
+        cls, pools: AddressIndexed, from_block: int, to_block: int
+    ) -> AddressIndexed:
+        """Bring pools fetched at an earlier block up to date, refetching only
+        the pools that changed since and any newly created ones
+
+        Args:
+            pools (AddressIndexed): pools as returned by get_pools at from_block - 1
+            from_block (int): first block not reflected in pools
+            to_block (int): block to update pools to
+
+        Returns:
+            AddressIndexed: pools at to_block
+        """
+        tokens = await Token.get_all_listed_tokens(to_block)
+        prices = await Price.get_prices(tokens, block_identifier=to_block)
+
+        tokens = tokens.index
+        prices = {price.token.token_id: price for price in prices}
+
+        changed = await cls.changed_since(pools, from_block, to_block)
+        # pools come in Sugar index order, so list position is the Sugar index
+        positions = [i for i, pool in enumerate(pools) if pool.lp_id in changed]
+
+        responses = await batch_call(
+            [(LP_SUGAR_ADDRESS, SUGAR_BY_INDEX.calldata(i)) for i in positions],
+            to_block,
         )
 
+        def patch() -> List[LiquidityPool]:
+            # everyone else only needs new listings and prices applied
+            result = list(map(lambda p: p.repriced(tokens, prices), pools))
+            for i, response in zip(positions, responses, strict=True):
+                pool_tuple = SUGAR_BY_INDEX.decode(response)
+                result[i] = LiquidityPool.from_tuple(pool_tuple, tokens, prices)
+            return result
+
+        result = await run_in_worker(patch)
+
+        # new pools get appended at the end
+        while True:
+            new_pools = await call_in_thread(
+                SUGAR_ALL(POOL_PAGE_SIZE, len(result)),
+                to_block,
+                lambda page: cls._decode_page(page, tokens, prices),
+            )
+            result += new_pools
+            if len(new_pools) < POOL_PAGE_SIZE:
+                break
+
+        cls._pool_count_hint = len(result)
+
+        return AddressIndexed(result, key=lambda p: p.lp_id)
+
     @classmethod
-    @cache_in_seconds(SUGAR_LPS_CACHE_MINUTES * 60)
-    async def by_address(cls, address: str) -> "LiquidityPool":
+    async def by_address(cls, address: str) -> Optional["LiquidityPool"]:
         pools = await cls.get_pools()
-        try:
-            a = normalize_address(address)
-            return next(pool for pool in pools if pool.lp == a)
-        except Exception:
-            return None
+        return pools.by_address(address)
 
     @classmethod
     async def search(cls, query: str, limit: int = 10) -> List["LiquidityPool"]:
-        def match_score(query: str, symbol: str):
-            return fuzz.token_sort_ratio(query, symbol)
-
-        query_lowercase = query.lower()
-        pools = await cls.get_pools()
-        pools = list(
-            filter(lambda p: p.token0 is not None and p.token1 is not None, pools)
-        )
+        return cls.search_pools(await cls.get_pools(), query, limit)
 
-        # look for exact match first, i.e. we get proper pool symbol in query (case insensitive)
-        exact_match = list(filter(lambda p: p.symbol.lower() == query_lowercase, pools))
+    @classmethod
+    def search_pools(
+        cls, pools: Sequence["LiquidityPool"], query: str, limit: int = 10
+    ) -> List["LiquidityPool"]:
+        """Fuzzy search pools by symbol
 
-        if len(exact_match) == 1:
-            return exact_match
+        Args:
+            pools (Sequence[LiquidityPool]): pools to search in
+            query (str): search query
+            limit (int, optional): max number of results. Defaults to 10.
 
-        pools_with_ratio = list(map(lambda p: (p, match_score(query, p.symbol)), pools))
-        pools_with_ratio.sort(key=lambda p: p[1], reverse=True)
+        Returns:
+            List[LiquidityPool]: single exact match or best matching pools
+        """
+        # thefuzz only comes along for bots that search
+        from .search import PoolSearchIndex
 
-        return list(map(lambda pwr: pwr[0], pools_with_ratio))[:limit]
+        return PoolSearchIndex.for_pools(pools).search(query, limit)
 
     @classmethod
     async def tvl(cls, pools) -> float:
+        # reserves come priced already, no need to hit RPC
         result = 0
 
-        tokens = await Token.get_all_listed_tokens()
-        prices = await Price.get_prices(tokens)
-        prices = {price.token.token_address: price for price in prices}
-
         for pool in pools:
             t0 = pool.token0
             t1 = pool.token1
@@ -358,6 +645,30 @@ class LiquidityPool:
 
         return result
 
+    def repriced(
+        self, tokens: Dict[int, Token], prices: Dict[int, Price]
+    ) -> "LiquidityPool":
+        """Same pool valued with new token listings and prices
+
+        Args:
+            tokens (Dict[int, Token]): listed tokens by address id
+            prices (Dict[int, Price]): prices by token address id
+
+        Returns:
+            LiquidityPool: repriced pool, or this one if none of its tokens
+            got listed or delisted and none of its prices moved
+        """
+        moved = any(
+            map(
+                lambda i: self._lookup(tokens, self._t[i])
+                != self._lookup(self._tokens, self._t[i])
+                or self._lookup(prices, self._t[i])
+                != self._lookup(self._prices, self._t[i]),
+                (7, 10, 20),
+            )
+        )
+        return LiquidityPool(self._t, tokens, prices) if moved else self
+
     @property
     def total_fees(self) -> float:
         result = 0
@@ -411,28 +722,42 @@ class LiquidityPoolEpoch:
     based on: https://github.com/velodrome-finance/sugar/blob/v2/contracts/LpSugar.vy#L69
     """
 
-    pool_address: str
+    pool_id: int
     bribes: List[Amount]
     fees: List[Amount]
 
     @classmethod
-    @cache_in_seconds(SUGAR_LPS_CACHE_MINUTES * 60)
-    async def fetch_latest(cls):
-        tokens = await Token.get_all_listed_tokens()
-        prices = await Price.get_prices(tokens)
-
-        prices = {price.token.token_address: price for price in prices}
-        tokens = {t.token_address: t for t in tokens}
-
-        sugar = w3.eth.contract(address=LP_SUGAR_ADDRESS, abi=LP_SUGAR_ABI)
-        pool_epochs = await sugar.functions.epochsLatest(
-            GOOD_ENOUGH_PAGINATION_LIMIT, 0
-        ).call()
+    @cache_stale_while_revalidate(
+        SUGAR_LPS_CACHE_MINUTES * 60,
+        CACHE_MAX_STALE_MINUTES * 60,
+        maxsize=CACHE_MAX_BLOCKS,
+    )
+    async def fetch_latest(
+        cls, block_identifier: BlockIdentifier = "latest"
+    ) -> AddressIndexed:
+        tokens = await Token.get_all_listed_tokens(block_identifier)
+        prices = await Price.get_prices(tokens, block_identifier=block_identifier)
+
+        prices = {price.token.token_id: price for price in prices}
+        tokens = tokens.index
+
+        return await call_in_thread(
+            SUGAR_EPOCHS_LATEST(GOOD_ENOUGH_PAGINATION_LIMIT, 0),
+            block_identifier,
+            lambda pool_epochs: cls._decode_epochs(pool_epochs, tokens, prices),
+        )
 
+    @classmethod
+    def _decode_epochs(
+        cls,
+        pool_epochs: List[Tuple],
+        tokens: Dict[int, Token],
+        prices: Dict[int, Price],
+    ) -> AddressIndexed:
         result = []
 
         for pe in pool_epochs:
-            pool_address, bribes, fees = pe[1], pe[4], pe[5]
+            pool_id, bribes, fees = addresses.id(pe[1]), pe[4], pe[5]
 
             bribes = list(
                 filter(
@@ -447,20 +772,18 @@ class LiquidityPoolEpoch:
                 )
             )
 
-            result.append(
-                LiquidityPoolEpoch(pool_address=pool_address, bribes=bribes, fees=fees)
-            )
+            result.append(LiquidityPoolEpoch(pool_id=pool_id, bribes=bribes, fees=fees))
 
-        return result
+        return AddressIndexed(result, key=lambda pe: pe.pool_id)
+
+    @property
+    def pool_address(self) -> str:
+        return addresses.checksum(self.pool_id)
 
     @classmethod
-    async def fetch_for_pool(cls, pool_address: str) -> "LiquidityPoolEpoch":
+    async def fetch_for_pool(cls, pool_address: str) -> Optional["LiquidityPoolEpoch"]:
         pool_epochs = await cls.fetch_latest()
-        try:
-            a = normalize_address(pool_address)
-            return next(pe for pe in pool_epochs if pe.pool_address == a)
-        except Exception:
-            return None
+        return pool_epochs.by_address(pool_address)
 
     @property
     def total_fees(self) -> float:
@@ -1,7 +1,4 @@
-from discord.ext import tasks
-
-from .settings import BOT_TICKER_INTERVAL_MINUTES
-from .data import LiquidityPool
+from .snapshot import snapshots
 from .helpers import LOGGER, amount_to_k_string
 from .ticker import TickerBot
 
@@ -18,13 +15,15 @@ class FeesBot(TickerBot):
         LOGGER.debug("------")
         await self.update_presence(f"Watching fees for {self.protocol_name}")
 
-    @tasks.loop(seconds=BOT_TICKER_INTERVAL_MINUTES * 60)
     async def ticker(self):
         try:
-            pools = await LiquidityPool.get_pools()
-            fees = sum(map(lambda p: p.total_fees, pools))
+            snapshot = await snapshots.get()
 
-            await self.update_nick_for_all_servers(f"Fees ~${amount_to_k_string(fees)}")
-            await self.update_presence(f"Based on {len(pools)} pools this epoch")
+            await self.update_nick_for_all_servers(
+                f"Fees ~${amount_to_k_string(snapshot.total_fees)}"
+            )
+            await self.update_presence(
+                f"Based on {len(snapshot.pools)} pools this epoch"
+            )
         except Exception as ex:
             LOGGER.error(f"Ticker failed with {ex}")
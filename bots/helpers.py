@@ -1,23 +1,99 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import json
 import logging
 import os
 import sys
+import threading
 import urllib
 
-from typing import List, Dict
-from web3 import Web3
-from async_lru import alru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    List,
+    Dict,
+    Callable,
+    Awaitable,
+    AsyncIterator,
+    Iterable,
+    Optional,
+)
+
+# eth_utils rather than web3 (same helpers), importing web3 takes most of a second
+from eth_utils import is_address as _is_address, to_checksum_address
 
 
 def is_address(value: str) -> bool:
-    return Web3.is_address(value)
+    return _is_address(value)
+
+
+class AddressTable:
+    """Interns addresses: every distinct address gets a small integer id
+    and is checksummed at most once"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._addresses: List[str] = []
+        self._checksums: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def id(self, address: str) -> int:
+        """Get id for address, assigning a new one if needed
+
+        Args:
+            address (str): address in any case
+
+        Returns:
+            int: address id
+        """
+        key = address.lower()
+        address_id = self._ids.get(key)
+        if address_id is None:
+            with self._lock:
+                address_id = self._ids.get(key)
+                if address_id is None:
+                    address_id = len(self._addresses)
+                    self._addresses.append(key)
+                    self._ids[key] = address_id
+        return address_id
+
+    def find(self, address: str) -> Optional[int]:
+        """Get id for an address seen before, without interning new ones
+
+        Args:
+            address (str): address in any case
+
+        Returns:
+            int: address id or None
+        """
+        return self._ids.get(address.lower())
 
+    def checksum(self, address_id: int) -> str:
+        """Get checksummed address for id
 
-def cache_in_seconds(seconds: int):
-    return alru_cache(ttl=seconds)
+        Args:
+            address_id (int): address id
+
+        Returns:
+            str: checksummed address
+        """
+        checksum = self._checksums.get(address_id)
+        if checksum is None:
+            checksum = to_checksum_address(self._addresses[address_id])
+            self._checksums[address_id] = checksum
+        return checksum
+
+
+addresses = AddressTable()
 
 
 def normalize_address(address: str) -> str:
-    return Web3.to_checksum_address(address.lower())
+    return addresses.checksum(addresses.id(address))
 
 
 def load_local_json_as_string(relative_path: str) -> str:
@@ -30,11 +106,133 @@ def load_local_json_as_string(relative_path: str) -> str:
     return result
 
 
+@functools.lru_cache(maxsize=None)
+def load_local_abi(relative_path: str) -> List[Dict]:
+    """Parse ABI JSON file, once per process
+
+    Args:
+        relative_path (str): path relative to the bots package
+
+    Returns:
+        List[Dict]: ABI entries
+    """
+    return json.loads(load_local_json_as_string(relative_path))
+
+
 def chunk(list_to_chunk: List, n: int):
     for i in range(0, len(list_to_chunk), n):
         yield list_to_chunk[i : i + n]
 
 
+class AddressIndexed(tuple):
+    """Immutable sequence that carries a prebuilt index keyed by address id,
+    so lookups do not have to scan the whole collection"""
+
+    def __new__(cls, items: Iterable, key: Callable[[Any], int]):
+        collection = super().__new__(cls, items)
+        collection.index = {}
+        for item in collection:
+            # first item wins, same as scanning the sequence
+            collection.index.setdefault(key(item), item)
+        return collection
+
+    def by_address(self, address: str) -> Optional[Any]:
+        """Get item by address
+
+        Args:
+            address (str): address in any case
+
+        Returns:
+            Any: matching item or None
+        """
+        # addresses never interned can't be in the index either
+        address_id = addresses.find(address)
+        return self.index.get(address_id) if address_id is not None else None
+
+
+# CPU bound work (ABI decoding, snapshot building) runs off the event loop on a
+# single thread, so there is only one thread competing with the loop for the GIL
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bots-worker")
+
+
+async def run_in_worker(fn: Callable[[], Any]) -> Any:
+    """Run CPU bound function on the worker thread
+
+    Args:
+        fn (Callable): function to run
+
+    Returns:
+        Any: whatever fn returns
+    """
+    return await asyncio.get_running_loop().run_in_executor(_worker, fn)
+
+
+def shared_future(coro: Awaitable) -> asyncio.Future:
+    """Schedule work shared by several callers, in a context of its own rather
+    than the one of whichever caller happened to start it
+
+    Args:
+        coro (Awaitable): coroutine to run
+
+    Returns:
+        asyncio.Future: future for its result
+    """
+    # tasks copy the context current when created
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+async def paginate(
+    fetch_page: Callable[[int, int], Awaitable[List]],
+    page_size: int,
+    max_in_flight: int,
+    expected_pages: int = 1,
+) -> AsyncIterator[List]:
+    """Fetch pages concurrently and yield them in order
+
+    The first `expected_pages` pages are requested speculatively (at most
+    `max_in_flight` at a time), so callers can yield while later pages are
+    still in flight. When the hint turns out too small, the look-ahead window
+    doubles with every full page. Iteration stops on the first short page.
+
+    Args:
+        fetch_page (Callable): coroutine function taking (limit, offset)
+        page_size (int): number of items per page
+        max_in_flight (int): max number of concurrent page requests
+        expected_pages (int, optional): how many pages we expect. Defaults to 1.
+
+    Yields:
+        List: pages in offset order
+    """
+    in_flight = collections.deque()
+    next_page = 0
+    page_limit = max(expected_pages, 1)
+    ramp = 1
+
+    try:
+        while True:
+            while len(in_flight) < max_in_flight and next_page < page_limit:
+                in_flight.append(
+                    asyncio.ensure_future(fetch_page(page_size, next_page * page_size))
+                )
+                next_page += 1
+
+            page_index = next_page - len(in_flight)
+            page = await in_flight.popleft()
+
+            yield page
+
+            if len(page) < page_size:
+                return
+
+            if page_index + 1 >= page_limit:
+                # more pages than expected, ramp up speculation
+                page_limit = page_index + 1 + ramp
+                ramp = min(ramp * 2, max_in_flight)
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
 def amount_to_k_string(amount: float) -> str:
     """Turns 2000 to "2K" """
     return f"{round(amount/1000, 2)}K"
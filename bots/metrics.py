@@ -0,0 +1,96 @@
+import asyncio
+import collections
+import contextlib
+import time
+
+from typing import Deque, Dict, Optional
+
+from .helpers import LOGGER
+from .settings import LOOP_LAG_INTERVAL_SECONDS, LOOP_LAG_WARN_SECONDS
+
+
+class RollingWindow:
+    """Keeps the last N samples around for cheap rolling stats"""
+
+    def __init__(self, size: int):
+        self.samples: Deque[float] = collections.deque(maxlen=size)
+
+    def add(self, value: float):
+        self.samples.append(value)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    @property
+    def mean(self) -> float:
+        return sum(self.samples) / len(self.samples) if self.samples else 0
+
+    def percentile(self, pct: float) -> float:
+        """Get percentile of the samples in the window
+
+        Args:
+            pct (float): percentile, 0 to 100
+
+        Returns:
+            float: sample at that percentile or 0 when empty
+        """
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class StageTimings:
+    """Rolling timings for each named stage of handling a request"""
+
+    def __init__(self, window: int):
+        self.stages: Dict[str, RollingWindow] = collections.defaultdict(
+            lambda: RollingWindow(window)
+        )
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name].add(time.perf_counter() - started_at)
+
+    def percentiles(self, pct: float) -> Dict[str, float]:
+        return {name: window.percentile(pct) for name, window in self.stages.items()}
+
+
+class LoopLagMonitor:
+    """Measures event loop lag, i.e. how late a periodic wakeup fires;
+    anything blocking the loop (and the Discord heartbeats) shows up here"""
+
+    def __init__(self, interval_seconds: float, window: int = 1000):
+        self.interval_seconds = interval_seconds
+        self.lags = RollingWindow(window)
+        self.max_lag = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected_at = loop.time() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(0, loop.time() - expected_at)
+
+            self.lags.add(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > LOOP_LAG_WARN_SECONDS:
+                LOGGER.warning(f"Event loop stalled for {lag * 1000:.0f}ms")
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+loop_lag = LoopLagMonitor(LOOP_LAG_INTERVAL_SECONDS)
@@ -1,7 +1,6 @@
-from discord.ext import tasks
-
-from .settings import BOT_TICKER_INTERVAL_MINUTES
+from .settings import PRICE_SIGNIFICANCE_THRESHOLD
 from .data import Token, Price
+from .snapshot import snapshots
 from .helpers import LOGGER
 from .ticker import TickerBot
 
@@ -9,6 +8,8 @@ from .ticker import TickerBot
 class PriceBot(TickerBot):
     """Price bot shows target token price in stable coin"""
 
+    significance_threshold = PRICE_SIGNIFICANCE_THRESHOLD
+
     def __init__(self, *args, source_token: Token, target_token: Token, **kwargs):
         """Create price bot for specific source token to target token
 
@@ -25,12 +26,35 @@ class PriceBot(TickerBot):
         LOGGER.debug("------")
         await self.update_presence(f"Based on {self.target_token.symbol} onchain quote")
 
-    @tasks.loop(seconds=BOT_TICKER_INTERVAL_MINUTES * 60)
+    async def prefetch(self):
+        await super().prefetch()
+        if (
+            not snapshots.follow
+            and snapshots.current.price(self.source_token.token_address) is None
+        ):
+            # priced directly on tick, get the price cache warmed up
+            await Price.get_prices([self.source_token])
+
     async def ticker(self):
         try:
-            [source_token_price] = await Price.get_prices([self.source_token])
+            snapshot = await snapshots.get()
+            source_token_price = snapshot.price(self.source_token.token_address)
+
+            if source_token_price is None and snapshots.follow:
+                # followers leave RPC to the fetcher, wait for it to price it
+                LOGGER.warning(
+                    f"No {self.source_token.symbol} price in published snapshot, "
+                    "skipping update"
+                )
+                return
+
+            if source_token_price is None:
+                # source token is not part of the listed tokens, price it directly
+                [source_token_price] = await Price.get_prices([self.source_token])
+
             await self.update_nick_for_all_servers(
-                f"~${source_token_price.pretty_price} / {self.source_token.symbol}"
+                f"~${source_token_price.pretty_price} / {self.source_token.symbol}",
+                source_token_price.price,
             )
         except Exception as ex:
             LOGGER.error(f"Ticker failed with {ex}")
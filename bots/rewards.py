@@ -1,7 +1,4 @@
-from discord.ext import tasks
-
-from .settings import BOT_TICKER_INTERVAL_MINUTES
-from .data import LiquidityPoolEpoch
+from .snapshot import snapshots
 from .helpers import LOGGER, amount_to_k_string
 from .ticker import TickerBot
 
@@ -18,12 +15,11 @@ class RewardsBot(TickerBot):
         LOGGER.debug("------")
         await self.update_presence(f"rewards for {self.protocol_name}")
 
-    @tasks.loop(seconds=BOT_TICKER_INTERVAL_MINUTES * 60)
     async def ticker(self):
         try:
-            lpes = await LiquidityPoolEpoch.fetch_latest()
-            fees = sum(map(lambda lpe: lpe.total_fees, lpes))
-            bribes = sum(map(lambda lpe: lpe.total_bribes, lpes))
+            snapshot = await snapshots.get()
+            fees = snapshot.epoch_fees
+            bribes = snapshot.epoch_bribes
 
             await self.update_nick_for_all_servers(
                 f"Rewards ~${amount_to_k_string(fees + bribes)}"
@@ -0,0 +1,431 @@
+import asyncio
+import collections
+import functools
+import json
+import time
+
+from aiohttp import ClientError, ClientResponseError, ClientSession, ClientTimeout
+from aiohttp import TCPConnector
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from web3 import AsyncWeb3
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from .codec import ViewCall
+from .helpers import LOGGER, chunk, run_in_worker
+from .metrics import RollingWindow
+from .settings import (
+    WEB3_PROVIDER_URIS,
+    RPC_BATCH_SIZE,
+    RPC_POOL_SIZE,
+    RPC_KEEPALIVE_SECONDS,
+    RPC_TIMEOUT_SECONDS,
+    RPC_STATS_WINDOW,
+    RPC_MAX_ERROR_RATE,
+    RPC_RETRY_UNHEALTHY_SECONDS,
+    RPC_DEADLINE_SECONDS,
+    RPC_HEDGE_PERCENTILE,
+    RPC_HEDGE_MIN_SAMPLES,
+)
+
+
+class Endpoint:
+    """Single RPC endpoint with its own keep-alive connection pool
+    and rolling latency / error stats"""
+
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.latencies = RollingWindow(RPC_STATS_WINDOW)
+        # same per kind of call, cheap and heavy calls don't mix for hedging
+        self.call_latencies: Dict[str, RollingWindow] = collections.defaultdict(
+            lambda: RollingWindow(RPC_STATS_WINDOW)
+        )
+        self.errors = RollingWindow(RPC_STATS_WINDOW)
+        self.last_error_at = 0
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors.mean
+
+    @property
+    def healthy(self) -> bool:
+        # unhealthy endpoints get another shot once they cool down
+        return (
+            self.error_rate <= RPC_MAX_ERROR_RATE
+            or time.monotonic() - self.last_error_at > RPC_RETRY_UNHEALTHY_SECONDS
+        )
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """How long to wait for this endpoint on a kind of call before hedging
+        to another one"""
+        latencies = self.call_latencies.get(kind)
+        if latencies is None or len(latencies) < RPC_HEDGE_MIN_SAMPLES:
+            return None
+        return latencies.percentile(RPC_HEDGE_PERCENTILE)
+
+    def session(self) -> ClientSession:
+        # sessions are bound to the loop they were created in
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop != loop:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=RPC_POOL_SIZE,
+                    keepalive_timeout=RPC_KEEPALIVE_SECONDS,
+                    ttl_dns_cache=300,
+                ),
+                timeout=ClientTimeout(total=RPC_TIMEOUT_SECONDS),
+                headers={"Content-Type": "application/json"},
+                raise_for_status=True,
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def post(self, payload: bytes, kind: str) -> bytes:
+        started_at = time.monotonic()
+        try:
+            async with self.session().post(self.uri, data=payload) as response:
+                result = await response.read()
+        except (ClientError, asyncio.TimeoutError):
+            self.errors.add(1)
+            self.last_error_at = time.monotonic()
+            raise
+
+        self.errors.add(0)
+        elapsed = time.monotonic() - started_at
+        self.latencies.add(elapsed)
+        self.call_latencies[kind].add(elapsed)
+        return result
+
+
+def _is_request_error(ex: Exception) -> bool:
+    """Client errors (bad or oversized requests) fail the same way everywhere"""
+    return (
+        isinstance(ex, ClientResponseError)
+        and 400 <= ex.status < 500
+        and ex.status != 429
+    )
+
+
+class RoutedHTTPProvider(AsyncJSONBaseProvider):
+    """Web3 provider spreading calls over several RPC endpoints: each call
+    goes to the fastest healthy endpoint and fails over to the next one"""
+
+    def __init__(self, endpoint_uris: List[str]):
+        self.endpoints = list(map(Endpoint, endpoint_uris))
+        super().__init__()
+
+    def __str__(self) -> str:
+        return f"RPC connection {', '.join(map(lambda e: e.uri, self.endpoints))}"
+
+    def ranked(self) -> List[Endpoint]:
+        """Endpoints ordered by preference: healthy first, then by latency"""
+        return sorted(self.endpoints, key=lambda e: (not e.healthy, e.latencies.mean))
+
+    async def make_raw_request(self, payload: bytes, kind: str = "raw") -> bytes:
+        """Post raw JSON-RPC payload within the call deadline,
+        hedging slow calls and failing over across endpoints
+
+        Args:
+            payload (bytes): JSON encoded request or batch
+            kind (str, optional): kind of call, for hedging. Defaults to "raw".
+
+        Returns:
+            bytes: raw response body
+        """
+        _, response = await self.routed_request(payload, kind)
+        return response
+
+    async def routed_request(
+        self, payload: bytes, kind: str, exclude: Set[Endpoint] = frozenset()
+    ) -> Tuple[Endpoint, bytes]:
+        """Same as make_raw_request, skipping excluded endpoints and telling
+        which endpoint the response came from
+
+        Args:
+            payload (bytes): JSON encoded request or batch
+            kind (str): kind of call, e.g. method name
+            exclude (Set[Endpoint], optional): endpoints not to use. Defaults to none.
+
+        Returns:
+            Tuple[Endpoint, bytes]: endpoint that answered, raw response body
+        """
+        return await asyncio.wait_for(
+            self._hedged_request(payload, kind, exclude), RPC_DEADLINE_SECONDS
+        )
+
+    async def _hedged_request(
+        self, payload: bytes, kind: str, exclude: Set[Endpoint]
+    ) -> Tuple[Endpoint, bytes]:
+        endpoints = list(filter(lambda e: e not in exclude, self.ranked()))
+        last_error = None
+
+        while endpoints:
+            primary = endpoints.pop(0)
+            attempts = {asyncio.ensure_future(primary.post(payload, kind))}
+            # attempt => endpoint it went to
+            sent_to = {next(iter(attempts)): primary}
+            hedge_delay = primary.hedge_delay(kind)
+
+            try:
+                while attempts:
+                    can_hedge = endpoints and hedge_delay and len(attempts) == 1
+                    done, attempts = await asyncio.wait(
+                        attempts,
+                        timeout=hedge_delay if can_hedge else None,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+
+                    if not done:
+                        # slower than usual for this endpoint, race it against the next one
+                        hedge = endpoints.pop(0)
+                        LOGGER.debug(f"Hedging slow RPC call to {hedge.uri}")
+                        attempt = asyncio.ensure_future(hedge.post(payload, kind))
+                        attempts.add(attempt)
+                        sent_to[attempt] = hedge
+                        hedge_delay = None
+                        continue
+
+                    for attempt in done:
+                        ex = attempt.exception()
+                        if ex is None:
+                            # first answer wins
+                            return sent_to[attempt], attempt.result()
+                        if _is_request_error(ex) or not isinstance(
+                            ex, (ClientError, asyncio.TimeoutError)
+                        ):
+                            raise ex
+                        LOGGER.debug(f"RPC call failed with {ex!r}")
+                        last_error = ex
+            finally:
+                for attempt in attempts:
+                    attempt.cancel()
+
+        raise last_error or RuntimeError("No RPC endpoints left to try")
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            if endpoint._session is not None:
+                await endpoint._session.close()
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        raw_response = await self.make_raw_request(
+            self.encode_rpc_request(method, params), method
+        )
+        return self.decode_rpc_response(raw_response)
+
+
+w3 = AsyncWeb3(RoutedHTTPProvider(WEB3_PROVIDER_URIS))
+
+# largest batch the provider accepted so far, shrinks when batches get rejected
+_batch_size = RPC_BATCH_SIZE
+
+
+class BatchRejected(Exception):
+    """Provider refused a JSON-RPC batch, most likely because it is too big"""
+
+
+class RPCError(ValueError):
+    """JSON-RPC error response"""
+
+
+async def _request(
+    payload: bytes,
+    kind: str,
+    parse: Callable[[bytes], Any],
+    block_identifier: Union[str, int],
+) -> Any:
+    """Post request and parse the response in a worker thread
+
+    Requests pinned to a block number get retried on the other endpoints when
+    answered with a JSON-RPC error: the block may have come from a faster
+    endpoint than the one answering, which doesn't have it yet.
+
+    Args:
+        payload (bytes): JSON encoded request or batch
+        kind (str): kind of call, for hedging
+        parse (Callable): raw response => result, raises RPCError on errors
+        block_identifier (Union[str, int]): block the request is pinned to
+
+    Returns:
+        Any: whatever parse returns
+    """
+    tried = set()
+    while True:
+        endpoint, raw_response = await w3.provider.routed_request(payload, kind, tried)
+        try:
+            return await run_in_worker(functools.partial(parse, raw_response))
+        except RPCError as ex:
+            tried.add(endpoint)
+            if not isinstance(block_identifier, int) or len(tried) == len(
+                w3.provider.endpoints
+            ):
+                raise
+            LOGGER.debug(
+                f"RPC call at block {block_identifier} failed on {endpoint.uri} "
+                f"with {ex}, trying the next endpoint"
+            )
+
+
+async def _post_batch(
+    requests: List[Dict], block_identifier: Union[str, int]
+) -> List[Dict]:
+    def parse(raw_response: bytes) -> List[Dict]:
+        response = json.loads(raw_response)
+
+        # providers answer oversized batches with a single error object
+        if not isinstance(response, list) or len(response) != len(requests):
+            raise BatchRejected(response)
+
+        errors = list(filter(None, map(lambda r: r.get("error"), response)))
+        if errors:
+            raise RPCError(errors[0])
+
+        return sorted(response, key=lambda r: r["id"])
+
+    return await _request(
+        json.dumps(requests).encode(), "eth_call batch", parse, block_identifier
+    )
+
+
+async def _send_batch(
+    requests: List[Dict], block_identifier: Union[str, int]
+) -> List[Dict]:
+    global _batch_size
+
+    try:
+        return await _post_batch(requests, block_identifier)
+    except (BatchRejected, ClientResponseError) as ex:
+        if len(requests) == 1 or (
+            isinstance(ex, ClientResponseError) and ex.status not in (400, 413)
+        ):
+            raise
+
+        _batch_size = max(1, min(_batch_size, len(requests) // 2))
+        LOGGER.debug(f"RPC batch rejected, retrying with batch size {_batch_size}")
+
+        batches = await asyncio.gather(
+            *map(
+                lambda batch: _send_batch(batch, block_identifier),
+                chunk(requests, _batch_size),
+            )
+        )
+        return [response for batch in batches for response in batch]
+
+
+def _eth_call_request(
+    request_id: int, to: str, data: str, block_identifier: Union[str, int]
+) -> Dict:
+    block = (
+        hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+    )
+    return {
+        "jsonrpc": "2.0",
+        "method": "eth_call",
+        "params": [{"to": to, "data": data}, block],
+        "id": request_id,
+    }
+
+
+async def batch_call(
+    calls: List[Tuple[str, str]], block_identifier: Union[str, int] = "latest"
+) -> List[bytes]:
+    """Send eth_calls packed into as few JSON-RPC batch requests as possible
+
+    Args:
+        calls (List[Tuple[str, str]]): (contract address, calldata) pairs
+        block_identifier (Union[str, int], optional): block to run the calls at.
+        Defaults to "latest".
+
+    Returns:
+        List[bytes]: raw call results, same order as calls
+    """
+    requests = [
+        _eth_call_request(i, to, data, block_identifier)
+        for i, (to, data) in enumerate(calls)
+    ]
+
+    batches = await asyncio.gather(
+        *map(
+            lambda batch: _send_batch(batch, block_identifier),
+            chunk(requests, _batch_size),
+        )
+    )
+
+    return [
+        bytes.fromhex(response["result"][2:]) for batch in batches for response in batch
+    ]
+
+
+async def call_in_thread(
+    call: ViewCall,
+    block_identifier: Union[str, int] = "latest",
+    then: Callable[[Any], Any] = lambda result: result,
+) -> Any:
+    """Run contract view, ABI decoding the result and building anything
+    on top of it in a worker thread so the event loop stays responsive
+
+    Args:
+        call (ViewCall): contract view call to run
+        block_identifier (Union[str, int], optional): block to run the call at.
+        Defaults to "latest".
+        then (Callable, optional): runs in the same thread on the decoded result.
+
+    Returns:
+        Any: whatever `then` returns
+    """
+    request = _eth_call_request(0, call.address, call.data, block_identifier)
+
+    def decode(raw_response: bytes) -> Any:
+        # big responses take a while to parse too
+        response = json.loads(raw_response)
+        if "error" in response:
+            raise RPCError(response["error"])
+        return then(call.decode(bytes.fromhex(response["result"][2:])))
+
+    return await _request(
+        json.dumps(request).encode(),
+        f"eth_call {call.view.name}",
+        decode,
+        block_identifier,
+    )
+
+
+async def get_logs_in_thread(
+    log_filter: Dict,
+    then: Callable[[List[Dict]], Any] = lambda logs: logs,
+) -> Any:
+    """Get logs, parsing them and building anything on top of them in a worker
+    thread so the event loop stays responsive
+
+    Logs come as raw JSON-RPC log objects, without web3 formatting.
+
+    Args:
+        log_filter (Dict): eth_getLogs filter, with int fromBlock and toBlock
+        then (Callable, optional): runs in the same thread on the logs.
+
+    Returns:
+        Any: whatever `then` returns
+    """
+    request = {
+        "jsonrpc": "2.0",
+        "method": "eth_getLogs",
+        "params": [
+            {
+                **log_filter,
+                "fromBlock": hex(log_filter["fromBlock"]),
+                "toBlock": hex(log_filter["toBlock"]),
+            }
+        ],
+        "id": 0,
+    }
+
+    def parse(raw_response: bytes) -> Any:
+        response = json.loads(raw_response)
+        if "error" in response:
+            raise RPCError(response["error"])
+        return then(response["result"])
+
+    return await _request(
+        json.dumps(request).encode(), "eth_getLogs", parse, log_filter["toBlock"]
+    )
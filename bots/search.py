@@ -0,0 +1,150 @@
+import bisect
+
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+from thefuzz import fuzz, process, utils
+
+
+def normalize_symbol(symbol: str) -> str:
+    """Normalize symbol the same way fuzz.token_sort_ratio does:
+    lowercase alphanumeric tokens, sorted and joined by space"""
+    return " ".join(sorted(utils.full_process(symbol, force_ascii=True).split()))
+
+
+class PoolSearchIndex:
+    """Search index over pool symbols, built once per pool refresh"""
+
+    def __init__(self, pools: Sequence):
+        # only pools with both tokens known are searchable
+        self.pools = list(
+            filter(lambda p: p.token0 is not None and p.token1 is not None, pools)
+        )
+        # position -> normalized symbol, scored in one batch on every search
+        self.symbols = dict(
+            enumerate(map(lambda p: normalize_symbol(p.symbol), self.pools))
+        )
+        self.exact: Dict[str, List] = defaultdict(list)
+        self.by_token: Dict[str, List[int]] = defaultdict(list)
+        prefixes = []
+
+        for position, pool in enumerate(self.pools):
+            self.exact[pool.symbol.lower()].append(pool)
+
+            tokens = set(normalize_symbol(pool.token0.symbol).split())
+            tokens.update(normalize_symbol(pool.token1.symbol).split())
+            for token in tokens:
+                self.by_token[token].append(position)
+
+            # pool symbol, token symbols and address are all valid prefixes
+            for key in (
+                pool.symbol,
+                pool.token0.symbol,
+                pool.token1.symbol,
+                pool.lp,
+            ):
+                prefixes.append((key.lower(), position))
+
+        # sorted keys for prefix lookups via bisect
+        prefixes.sort()
+        self.prefix_keys = list(map(lambda p: p[0], prefixes))
+        self.prefix_positions = list(map(lambda p: p[1], prefixes))
+
+    @classmethod
+    def for_pools(cls, pools: Sequence) -> "PoolSearchIndex":
+        """Get search index for a pool collection, building it on first use
+
+        Args:
+            pools (Sequence): pool collection, index is kept on it when possible
+
+        Returns:
+            PoolSearchIndex: search index
+        """
+        index = getattr(pools, "search_index", None)
+        if index is None:
+            index = PoolSearchIndex(pools)
+            try:
+                pools.search_index = index
+            except AttributeError:
+                # plain lists and tuples can't carry the index around
+                pass
+        return index
+
+    def candidates(self, query_tokens: List[str], limit: int) -> Dict[int, str]:
+        """Narrow down pools to the ones sharing a token with the query"""
+        positions = set()
+        for token in query_tokens:
+            positions.update(self.by_token.get(token, []))
+
+        # not enough to fill the results, score everything
+        if len(positions) < limit:
+            return self.symbols
+
+        return {position: self.symbols[position] for position in sorted(positions)}
+
+    def fuzzy_match(self, normalized_query: str, limit: int) -> List[int]:
+        """Best matching pool positions, scored in one batch"""
+        # symbols are normalized upfront so plain ratio equals token_sort_ratio
+        matches = process.extract(
+            normalized_query,
+            self.candidates(normalized_query.split(), limit),
+            processor=None,
+            scorer=fuzz.ratio,
+            limit=limit,
+        )
+        return list(map(lambda match: match[2], matches))
+
+    def search(self, query: str, limit: int = 10) -> List:
+        """Fuzzy search pools by symbol
+
+        Args:
+            query (str): search query
+            limit (int, optional): max number of results. Defaults to 10.
+
+        Returns:
+            List: single exact match or best matching pools
+        """
+        # look for exact match first, i.e. we get proper pool symbol in query (case insensitive)
+        exact_match = self.exact.get(query.lower(), [])
+
+        if len(exact_match) == 1:
+            return list(exact_match)
+
+        normalized_query = normalize_symbol(query)
+
+        if normalized_query == "":
+            return self.pools[:limit]
+
+        positions = self.fuzzy_match(normalized_query, limit)
+        return list(map(lambda position: self.pools[position], positions))
+
+    def autocomplete(self, query: str, limit: int = 25) -> List:
+        """Suggest pools for partial input: prefix matches on pool symbol,
+        token symbols or address first, topped up with fuzzy matches
+
+        Args:
+            query (str): partial user input
+            limit (int, optional): max number of suggestions. Defaults to 25.
+
+        Returns:
+            List: suggested pools
+        """
+        prefix = query.strip().lower()
+        # dict keeps insertion order and dedupes positions
+        positions = {}
+
+        start = bisect.bisect_left(self.prefix_keys, prefix)
+        for i in range(start, len(self.prefix_keys)):
+            if len(positions) >= limit or not self.prefix_keys[i].startswith(prefix):
+                break
+            positions.setdefault(self.prefix_positions[i], None)
+
+        normalized_query = normalize_symbol(query)
+
+        if len(positions) < limit and normalized_query != "":
+            for position in self.fuzzy_match(normalized_query, limit):
+                if len(positions) >= limit:
+                    break
+                positions.setdefault(position, None)
+
+        return list(map(lambda position: self.pools[position], positions))
@@ -5,11 +5,23 @@ from .helpers import load_local_json_as_string, normalize_address
 
 load_dotenv()
 
-# ABIs for Sugar and Price Oracle
+# ABIs for Sugar and Price Oracle, only read on first use
 # see: https://github.com/velodrome-finance/sugar
 # and  https://github.com/velodrome-finance/oracle
-LP_SUGAR_ABI = load_local_json_as_string("abi/lp_sugar.json")
-PRICE_ORACLE_ABI = load_local_json_as_string("abi/price_oracle.json")
+LP_SUGAR_ABI_PATH = "abi/lp_sugar.json"
+PRICE_ORACLE_ABI_PATH = "abi/price_oracle.json"
+
+
+def __getattr__(name: str) -> str:
+    # LP_SUGAR_ABI and PRICE_ORACLE_ABI, as JSON strings
+    paths = {
+        "LP_SUGAR_ABI": LP_SUGAR_ABI_PATH,
+        "PRICE_ORACLE_ABI": PRICE_ORACLE_ABI_PATH,
+    }
+    if name in paths:
+        return load_local_json_as_string(paths[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # auth tokens for bots
 # grab them at https://discord.com/developers/applications
@@ -19,12 +31,32 @@ DISCORD_TOKEN_FEES = os.environ.get("DISCORD_TOKEN_FEES")
 DISCORD_TOKEN_REWARDS = os.environ.get("DISCORD_TOKEN_REWARDS")
 DISCORD_TOKEN_COMMANDER = os.environ.get("DISCORD_TOKEN_COMMANDER")
 
-# RPC gateway
+# RPC gateway, several comma separated URIs can be used for failover
 WEB3_PROVIDER_URI = os.environ["WEB3_PROVIDER_URI"]
+WEB3_PROVIDER_URIS = list(map(lambda uri: uri.strip(), WEB3_PROVIDER_URI.split(",")))
 LP_SUGAR_ADDRESS = os.environ["LP_SUGAR_ADDRESS"]
 PRICE_ORACLE_ADDRESS = os.environ["PRICE_ORACLE_ADDRESS"]
 # when pricing a bunch of tokens, we batch the full list into smaller chunks
 PRICE_BATCH_SIZE = int(os.environ["PRICE_BATCH_SIZE"])
+# max number of calls packed into a single JSON-RPC batch request,
+# lowered automatically if the provider rejects batches that big
+RPC_BATCH_SIZE = int(os.environ.get("RPC_BATCH_SIZE", 50))
+# keep-alive connection pool per RPC endpoint
+RPC_POOL_SIZE = 20
+RPC_KEEPALIVE_SECONDS = 60
+RPC_TIMEOUT_SECONDS = 10
+# endpoints are ranked on their last N calls and skipped when
+# too many of them failed, until they cool down
+RPC_STATS_WINDOW = 50
+RPC_MAX_ERROR_RATE = 0.5
+RPC_RETRY_UNHEALTHY_SECONDS = 30
+# deadline for a call, hedged duplicates and failovers included; calls all
+# come from snapshot builds, which bots never wait on once they have one
+RPC_DEADLINE_SECONDS = 30
+# calls slower than this latency percentile of their endpoint get
+# a hedged duplicate sent to the next best endpoint
+RPC_HEDGE_PERCENTILE = 95
+RPC_HEDGE_MIN_SAMPLES = 10
 
 # protocol we are dealing with: Velodrome | Aerodrome
 PROTOCOL_NAME = os.environ["PROTOCOL_NAME"]
@@ -46,12 +78,47 @@ CONNECTOR_TOKENS_ADDRESSES = list(
 
 # how often ticker bots update
 BOT_TICKER_INTERVAL_MINUTES = int(os.environ["BOT_TICKER_INTERVAL_MINUTES"])
+# tickers get their data refreshed this long before they fire, with first ticks
+# spread over TICKER_START_JITTER_SECONDS so bots don't all hit RPC together
+TICKER_PREFETCH_SECONDS = 10
+TICKER_START_JITTER_SECONDS = 15
+# tick latency samples kept per bot
+TICKER_LATENCY_WINDOW = 100
+# nick edits are spread over this share of the ticker interval, a few at a time
+NICK_UPDATE_SPREAD = 0.5
+NICK_UPDATE_CONCURRENCY = 4
+# unchanged (or, for bots with a significance threshold, barely changed)
+# nicks and presences are only re-published once they get this old
+TICKER_FORCE_REFRESH_MINUTES = int(os.environ.get("TICKER_FORCE_REFRESH_MINUTES", 60))
+# price bot only re-publishes on price moves of at least this fraction
+PRICE_SIGNIFICANCE_THRESHOLD = float(
+    os.environ.get("PRICE_SIGNIFICANCE_THRESHOLD", 0.005)
+)
 # caching time for sugar tokens calls
 SUGAR_TOKENS_CACHE_MINUTES = int(os.environ["SUGAR_TOKENS_CACHE_MINUTES"])
 # caching time for sugar liquidity pools calls
 SUGAR_LPS_CACHE_MINUTES = int(os.environ["SUGAR_LPS_CACHE_MINUTES"])
 # caching time for oracle price calls
 ORACLE_PRICES_CACHE_MINUTES = int(os.environ["ORACLE_PRICES_CACHE_MINUTES"])
+# stale cached values are served while refreshing in the background,
+# up until they are this old
+CACHE_MAX_STALE_MINUTES = int(os.environ.get("CACHE_MAX_STALE_MINUTES", 60))
+
+# block pinned results kept per cached data call, a few recent blocks is plenty:
+# they only spare repeated reads within a snapshot build
+CACHE_MAX_BLOCKS = 8
+# snapshots (tokens, prices, pools and epochs, all read at the latest block)
+# get rebuilt this often, by default as often as the cached data calls expire
+SNAPSHOT_REFRESH_MINUTES = int(
+    os.environ.get(
+        "SNAPSHOT_REFRESH_MINUTES",
+        min(
+            SUGAR_TOKENS_CACHE_MINUTES,
+            SUGAR_LPS_CACHE_MINUTES,
+            ORACLE_PRICES_CACHE_MINUTES,
+        ),
+    )
+)
 
 # default pagination limit for api calls
 GOOD_ENOUGH_PAGINATION_LIMIT = 2000
@@ -59,5 +126,34 @@ GOOD_ENOUGH_PAGINATION_LIMIT = 2000
 # pagination limit for pools
 POOL_PAGE_SIZE = 500
 
+# max number of pool pages requested concurrently
+POOL_PAGE_CONCURRENCY = 4
+
+# command stage timings kept, for latency percentiles
+COMMAND_TIMINGS_WINDOW = 1000
+
+# how often event loop lag gets sampled and how much of it is worth a warning
+LOOP_LAG_INTERVAL_SECONDS = 0.1
+LOOP_LAG_WARN_SECONDS = 0.05
+
+# file the latest snapshot is persisted to and restored from on startup,
+# served as stale while a fresh one gets built; unset disables it
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH") or None
+# several bot processes can share one fetcher: the fetcher runs with
+# SNAPSHOT_PATH only, the rest follow it, skipping RPC and checking
+# for newly published snapshots every SNAPSHOT_FOLLOW_SECONDS
+SNAPSHOT_FOLLOW = os.environ.get("SNAPSHOT_FOLLOW", "false").lower() == "true"
+SNAPSHOT_FOLLOW_SECONDS = 1
+
+# incremental pool refreshes only refetch pools with events in the scanned
+# block range; wider ranges and every POOL_FULL_RESYNC_MINUTES do a full resync
+POOL_LOGS_MAX_BLOCK_RANGE = int(os.environ.get("POOL_LOGS_MAX_BLOCK_RANGE", 2000))
+POOL_FULL_RESYNC_MINUTES = int(os.environ.get("POOL_FULL_RESYNC_MINUTES", 60))
+# pool addresses per eth_getLogs filter when looking for changed pools
+POOL_LOGS_ADDRESS_BATCH = 500
+
+# rendered pool embeds and select options kept around
+RENDER_CACHE_SIZE = 256
+
 # image shown on discord embeds for pool stats
 UI_POOL_STATS_THUMBNAIL = os.environ["UI_POOL_STATS_THUMBNAIL"]
@@ -0,0 +1,618 @@
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, List, Tuple
+
+from .columns import PoolColumns
+from .data import Token, Amount, Price, LiquidityPool, LiquidityPoolEpoch
+from .helpers import (
+    LOGGER,
+    AddressIndexed,
+    addresses,
+    run_in_worker,
+    shared_future,
+)
+from .rpc import w3
+from .settings import (
+    POOL_LOGS_MAX_BLOCK_RANGE,
+    POOL_FULL_RESYNC_MINUTES,
+    SNAPSHOT_PATH,
+    SNAPSHOT_REFRESH_MINUTES,
+    SNAPSHOT_FOLLOW,
+    SNAPSHOT_FOLLOW_SECONDS,
+)
+
+# bump when the persisted snapshot layout changes, older files get ignored
+SNAPSHOT_FORMAT = 2
+
+
+@dataclass(frozen=True)
+class ProtocolSnapshot:
+    """Immutable, versioned view of protocol data shared by all the bots"""
+
+    version: int
+    block_number: int
+    created_at: float
+    # when pools were last fetched in full rather than patched
+    synced_at: float
+    tokens: AddressIndexed
+    # token address id => price
+    prices: Mapping[int, Price]
+    pools: AddressIndexed
+    # same pools as arrays, for aggregate metrics
+    columns: PoolColumns
+    epochs: AddressIndexed
+    tvl: float
+    total_fees: float
+    epoch_fees: float
+    epoch_bribes: float
+    # restored from disk, a fresh one is on its way
+    stale: bool = False
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        """Identifies snapshot contents: versions alone can repeat, e.g. when
+        a followed fetcher starts over"""
+        return (self.version, self.block_number)
+
+    @classmethod
+    async def build(
+        cls,
+        version: int,
+        block_number: int,
+        previous: Optional["ProtocolSnapshot"] = None,
+    ) -> "ProtocolSnapshot":
+        """Fetch all protocol data at given block and precompute totals
+
+        With a previous snapshot around, only pools that changed since its
+        block get refetched, unless a full resync is due.
+
+        Args:
+            version (int): snapshot version
+            block_number (int): block all the data is read at
+            previous (ProtocolSnapshot, optional): snapshot to update. Defaults to None.
+
+        Returns:
+            ProtocolSnapshot: new snapshot
+        """
+        # everything is read at the same block so reserves and prices line up
+        tokens = await Token.get_all_listed_tokens(block_number)
+        full_resync = (
+            previous is None
+            or block_number - previous.block_number > POOL_LOGS_MAX_BLOCK_RANGE
+            or time.time() - previous.synced_at > POOL_FULL_RESYNC_MINUTES * 60
+        )
+
+        prices, (pools, full_resync), epochs = await asyncio.gather(
+            Price.get_prices(tokens, block_identifier=block_number),
+            cls._fetch_pools(block_number, previous, full_resync),
+            LiquidityPoolEpoch.fetch_latest(block_number),
+        )
+
+        # indexing and totals are CPU work, keep them off the event loop
+        return await run_in_worker(
+            lambda: cls.assemble(
+                version=version,
+                block_number=block_number,
+                created_at=time.time(),
+                synced_at=time.time() if full_resync else previous.synced_at,
+                tokens=tokens,
+                prices=prices,
+                pools=pools,
+                epochs=epochs,
+            )
+        )
+
+    @classmethod
+    async def _fetch_pools(
+        cls,
+        block_number: int,
+        previous: Optional["ProtocolSnapshot"],
+        full_resync: bool,
+    ) -> Tuple[AddressIndexed, bool]:
+        # pools at block and whether they got fetched in full
+        if not full_resync:
+            try:
+                pools = await LiquidityPool.update_pools(
+                    previous.pools, previous.block_number + 1, block_number
+                )
+                return pools, False
+            except Exception as ex:
+                # e.g. more logs than the provider returns, or a lagging endpoint
+                LOGGER.warning(f"Pool update failed with {ex}, resyncing in full")
+        return await LiquidityPool.get_pools(block_number), True
+
+    @classmethod
+    def assemble(
+        cls,
+        version: int,
+        block_number: int,
+        created_at: float,
+        synced_at: float,
+        tokens: AddressIndexed,
+        prices: List[Price],
+        pools: AddressIndexed,
+        epochs: AddressIndexed,
+        stale: bool = False,
+        columns: Optional[PoolColumns] = None,
+    ) -> "ProtocolSnapshot":
+        prices_by_token = MappingProxyType({p.token.token_id: p for p in prices})
+        if columns is None:
+            columns = PoolColumns.from_pools(pools, tokens.index, prices_by_token)
+
+        return ProtocolSnapshot(
+            version=version,
+            block_number=block_number,
+            created_at=created_at,
+            synced_at=synced_at,
+            tokens=tokens,
+            prices=prices_by_token,
+            pools=pools,
+            columns=columns,
+            epochs=epochs,
+            tvl=columns.total_tvl,
+            total_fees=columns.total_fees,
+            epoch_fees=sum(map(lambda lpe: lpe.total_fees, epochs)),
+            epoch_bribes=sum(map(lambda lpe: lpe.total_bribes, epochs)),
+            stale=stale,
+        )
+
+    def save(self, path: str):
+        """Persist snapshot into a SQLite file, replacing it atomically
+
+        Addresses are stored as such, address ids only hold within a process.
+        Pool columns go to a .npy file of their own next to it, for loads to
+        map rather than read.
+
+        Args:
+            path (str): file to write
+        """
+        # versioned so a snapshot never points to columns of another one,
+        # written ahead of the snapshot referencing it
+        columns_path = f"{path}.v{self.version}.columns.npy"
+        with open(f"{columns_path}.tmp", "wb") as f:
+            np.save(f, self.columns.to_array())
+        os.replace(f"{columns_path}.tmp", columns_path)
+
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        db = sqlite3.connect(tmp_path)
+        try:
+            db.executescript(
+                """
+                CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+                CREATE TABLE tokens (
+                    address TEXT, symbol TEXT, decimals INTEGER, listed INTEGER
+                );
+                CREATE TABLE prices (address TEXT, price REAL);
+                CREATE TABLE pools (position INTEGER PRIMARY KEY, data TEXT);
+                CREATE TABLE epochs (pool TEXT, bribes TEXT, fees TEXT);
+                """
+            )
+            db.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [
+                    ("format", SNAPSHOT_FORMAT),
+                    ("version", self.version),
+                    ("block_number", self.block_number),
+                    ("created_at", self.created_at),
+                    ("synced_at", self.synced_at),
+                    ("columns", os.path.basename(columns_path)),
+                ],
+            )
+            db.executemany(
+                "INSERT INTO tokens VALUES (?, ?, ?, ?)",
+                map(
+                    lambda t: (t.token_address, t.symbol, t.decimals, t.listed),
+                    self.tokens,
+                ),
+            )
+            db.executemany(
+                "INSERT INTO prices VALUES (?, ?)",
+                map(lambda p: (p.token.token_address, p.price), self.prices.values()),
+            )
+            # big ints don't fit SQLite integers, raw Sugar tuples go as JSON
+            db.executemany(
+                "INSERT INTO pools VALUES (?, ?)",
+                enumerate(map(lambda p: json.dumps(p.to_tuple()), self.pools)),
+            )
+            db.executemany(
+                "INSERT INTO epochs VALUES (?, ?, ?)",
+                map(
+                    lambda pe: (
+                        pe.pool_address,
+                        json.dumps(_dump_amounts(pe.bribes)),
+                        json.dumps(_dump_amounts(pe.fees)),
+                    ),
+                    self.epochs,
+                ),
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        os.replace(tmp_path, path)
+
+        # columns of the snapshot just replaced may still be getting loaded,
+        # anything older has no readers left (mapped files outlive removal)
+        old_columns = sorted(
+            glob.glob(f"{glob.escape(path)}.v*.columns.npy"),
+            key=os.path.getmtime,
+            reverse=True,
+        )[2:]
+        for old_path in old_columns:
+            os.remove(old_path)
+
+    @classmethod
+    def published_version(cls, path: str) -> Optional[int]:
+        """Get version of the snapshot persisted at path, without loading it
+
+        Args:
+            path (str): file to read
+
+        Returns:
+            int: snapshot version or None if there is none usable
+        """
+        if not os.path.exists(path):
+            return None
+
+        db = sqlite3.connect(path)
+        try:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+        finally:
+            db.close()
+
+        return meta.get("version") if meta.get("format") == SNAPSHOT_FORMAT else None
+
+    @classmethod
+    def load(cls, path: str, stale: bool = True) -> Optional["ProtocolSnapshot"]:
+        """Load snapshot persisted with save
+
+        Args:
+            path (str): file to read
+            stale (bool, optional): whether a fresher snapshot is on its way,
+                rather than this being the latest one. Defaults to True.
+
+        Returns:
+            ProtocolSnapshot: persisted snapshot or None if there is none usable
+        """
+        if not os.path.exists(path):
+            return None
+
+        db = sqlite3.connect(path)
+        try:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            if meta.get("format") != SNAPSHOT_FORMAT:
+                return None
+
+            tokens = AddressIndexed(
+                map(
+                    lambda row: Token(
+                        token_id=addresses.id(row[0]),
+                        symbol=row[1],
+                        decimals=row[2],
+                        listed=bool(row[3]),
+                    ),
+                    db.execute("SELECT * FROM tokens"),
+                ),
+                key=lambda t: t.token_id,
+            )
+            prices = list(
+                map(
+                    lambda row: Price(token=tokens.by_address(row[0]), price=row[1]),
+                    db.execute("SELECT * FROM prices"),
+                )
+            )
+            prices_index = {p.token.token_id: p for p in prices}
+            pools = AddressIndexed(
+                map(
+                    lambda row: LiquidityPool.from_tuple(
+                        tuple(json.loads(row[0])), tokens.index, prices_index
+                    ),
+                    db.execute("SELECT data FROM pools ORDER BY position"),
+                ),
+                key=lambda p: p.lp_id,
+            )
+            epochs = AddressIndexed(
+                map(
+                    lambda row: LiquidityPoolEpoch(
+                        pool_id=addresses.id(row[0]),
+                        bribes=_load_amounts(row[1], tokens, prices_index),
+                        fees=_load_amounts(row[2], tokens, prices_index),
+                    ),
+                    db.execute("SELECT * FROM epochs"),
+                ),
+                key=lambda pe: pe.pool_id,
+            )
+        finally:
+            db.close()
+
+        return cls.assemble(
+            version=meta["version"],
+            block_number=meta["block_number"],
+            created_at=meta["created_at"],
+            synced_at=meta["synced_at"],
+            tokens=tokens,
+            prices=prices,
+            pools=pools,
+            epochs=epochs,
+            stale=stale,
+            columns=_map_columns(path, meta.get("columns"), pools),
+        )
+
+    def price(self, token_address: str) -> Optional[Price]:
+        token_id = addresses.find(token_address)
+        return self.prices.get(token_id) if token_id is not None else None
+
+    def pool(self, address: str) -> Optional[LiquidityPool]:
+        return self.pools.by_address(address)
+
+    def epoch_for_pool(self, pool_address: str) -> Optional[LiquidityPoolEpoch]:
+        return self.epochs.by_address(pool_address)
+
+    def pool_metrics(self, pool_address: str) -> Optional[Tuple[float, float]]:
+        """TVL and APR of a pool, read off the columns
+
+        Returns:
+            Optional[Tuple[float, float]]: TVL and APR, None if not in snapshot
+        """
+        row = self.columns.row(pool_address)
+        if row is None:
+            return None
+        return float(self.columns.tvl[row]), float(self.columns.apr[row])
+
+    def search(self, query: str, limit: int = 10) -> List[LiquidityPool]:
+        return LiquidityPool.search_pools(self.pools, query, limit)
+
+    def autocomplete(self, query: str, limit: int = 25) -> List[LiquidityPool]:
+        from .search import PoolSearchIndex
+
+        return PoolSearchIndex.for_pools(self.pools).autocomplete(query, limit)
+
+
+def _map_columns(
+    path: str, columns_name: Optional[str], pools: AddressIndexed
+) -> Optional[PoolColumns]:
+    # mapped read only: processes loading the same snapshot share its pages
+    if columns_name is None:
+        return None
+    try:
+        array = np.load(
+            os.path.join(os.path.dirname(path), columns_name), mmap_mode="r"
+        )
+    except FileNotFoundError:
+        # already replaced by newer ones, columns get rebuilt from pools
+        return None
+    return PoolColumns.from_array(pools, array)
+
+
+def _dump_amounts(amounts: List[Amount]) -> List:
+    return list(map(lambda a: (a.token.token_address, a.amount), amounts))
+
+
+def _load_amounts(
+    data: str, tokens: AddressIndexed, prices: Mapping[int, Price]
+) -> List[Amount]:
+    def load(token_address: str, amount: float) -> Amount:
+        token = tokens.by_address(token_address)
+        return Amount(token=token, amount=amount, price=prices[token.token_id])
+
+    return list(map(lambda a: load(*a), json.loads(data)))
+
+
+class SnapshotEngine:
+    """Builds a new protocol snapshot every refresh interval;
+    bots read the current one instead of fetching data on their own
+
+    Following, it builds nothing: snapshots come from another process (a
+    single fetcher for any number of bot processes) persisting them to path,
+    and get loaded as they are published.
+    """
+
+    def __init__(
+        self, refresh_seconds: int, path: Optional[str] = None, follow: bool = False
+    ):
+        if follow and not path:
+            raise ValueError("Following snapshots needs a path to read them from")
+        self.refresh_seconds = refresh_seconds
+        # where snapshots get persisted for warm starts, if anywhere
+        self.path = path
+        self.follow = follow
+        # index pools for search as snapshots come in, for bots that search
+        self.index_search = False
+        self._current: Optional[ProtocolSnapshot] = None
+        # when the current snapshot was last refreshed (or found up to date)
+        self._refreshed_at: Optional[float] = None
+        self._restoring: Optional[asyncio.Future] = None
+        self._refreshing: Optional[asyncio.Future] = None
+        self._persisting: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def current(self) -> Optional[ProtocolSnapshot]:
+        return self._current
+
+    async def get(self) -> ProtocolSnapshot:
+        """Get current snapshot, building the first one if needed
+
+        Returns:
+            ProtocolSnapshot: current snapshot
+        """
+        if self._current is not None:
+            return self._current
+        return await self.refresh()
+
+    async def restore(self) -> Optional[ProtocolSnapshot]:
+        """Serve the last persisted snapshot, marked as stale, until a fresh one
+        gets built; it only gets loaded once, concurrent callers share the load
+
+        Returns:
+            Optional[ProtocolSnapshot]: current snapshot, if there is one
+        """
+        if self._restoring is None:
+            self._restoring = asyncio.ensure_future(self._restore())
+        await asyncio.shield(self._restoring)
+        return self._current
+
+    async def _restore(self):
+        if self._current is None and self.path:
+            try:
+                self._current = await self._indexed(
+                    await run_in_worker(
+                        lambda: ProtocolSnapshot.load(self.path, stale=not self.follow)
+                    )
+                )
+            except Exception as ex:
+                LOGGER.warning(f"Snapshot restore failed with {ex}")
+            if self._current is not None:
+                LOGGER.debug(
+                    f"Restored protocol snapshot v{self._current.version} "
+                    f"at block {self._current.block_number}"
+                )
+
+    async def get_fresh(self, max_age_seconds: float) -> ProtocolSnapshot:
+        """Get current snapshot, refreshing it first if it is older than max age
+
+        Args:
+            max_age_seconds (float): max snapshot age
+
+        Returns:
+            ProtocolSnapshot: current snapshot
+        """
+        if self._current is not None and self.due_in(max_age_seconds) > 0:
+            return self._current
+        return await self.refresh()
+
+    def due_in(self, max_age_seconds: Optional[float] = None) -> float:
+        """Seconds until the current snapshot gets older than max age
+
+        Args:
+            max_age_seconds (float, optional): max snapshot age.
+            Defaults to refresh_seconds.
+
+        Returns:
+            float: seconds left, 0 when due already
+        """
+        if self._refreshed_at is None:
+            return 0
+        if max_age_seconds is None:
+            max_age_seconds = self.refresh_seconds
+        return max(self._refreshed_at + max_age_seconds - time.time(), 0)
+
+    async def refresh(self) -> ProtocolSnapshot:
+        # concurrent callers share the same build
+        if self._refreshing is None:
+            self._refreshing = shared_future(self._build())
+        return await asyncio.shield(self._refreshing)
+
+    async def _build(self) -> ProtocolSnapshot:
+        try:
+            if self.follow:
+                return await self._load_published()
+
+            block_number = await w3.eth.block_number
+            if self._current and self._current.block_number >= block_number:
+                # chain head has not moved (or a lagging endpoint answered)
+                LOGGER.debug(
+                    f"Still at block {block_number}, skipping snapshot refresh"
+                )
+                self._refreshed_at = time.time()
+                return self._current
+
+            version = self._current.version + 1 if self._current else 1
+            snapshot = await self._indexed(
+                await ProtocolSnapshot.build(version, block_number, self._current)
+            )
+            # swapping the reference is atomic for readers
+            self._current = snapshot
+            self._refreshed_at = time.time()
+            LOGGER.debug(f"Built protocol snapshot v{snapshot.version}")
+            if self.path:
+                # nobody needs to wait for the file to be written
+                self._persisting = asyncio.create_task(self._persist(snapshot))
+            return snapshot
+        finally:
+            self._refreshing = None
+
+    async def _load_published(self) -> ProtocolSnapshot:
+        while True:
+            version = await run_in_worker(
+                lambda: ProtocolSnapshot.published_version(self.path)
+            )
+            # any other version is news, the fetcher might have started over
+            if version is not None and (
+                self._current is None or version != self._current.version
+            ):
+                snapshot = await self._indexed(
+                    await run_in_worker(
+                        lambda: ProtocolSnapshot.load(self.path, stale=False)
+                    )
+                )
+                if snapshot is not None:
+                    self._current = snapshot
+                    self._refreshed_at = time.time()
+                    LOGGER.debug(
+                        f"Loaded published protocol snapshot v{snapshot.version}"
+                    )
+                    return snapshot
+
+            if self._current is not None:
+                self._refreshed_at = time.time()
+                return self._current
+
+            # nothing published yet
+            await asyncio.sleep(SNAPSHOT_FOLLOW_SECONDS)
+
+    async def _indexed(
+        self, snapshot: Optional[ProtocolSnapshot]
+    ) -> Optional[ProtocolSnapshot]:
+        """Build search index of snapshot pools off the loop if needed, so
+        /pool queries don't pay for it"""
+        if snapshot is not None and self.index_search:
+            from .search import PoolSearchIndex
+
+            await run_in_worker(lambda: PoolSearchIndex.for_pools(snapshot.pools))
+        return snapshot
+
+    async def _persist(self, snapshot: ProtocolSnapshot):
+        try:
+            await run_in_worker(lambda: snapshot.save(self.path))
+        except Exception as ex:
+            LOGGER.warning(f"Snapshot persist failed with {ex}")
+
+    async def run(self):
+        """Keep snapshots refreshed; a single schedule, by snapshot age, so
+        refreshes asked for by others (e.g. ticker prefetches) count too"""
+        while True:
+            try:
+                if self.follow:
+                    await self.refresh()
+                else:
+                    await self.get_fresh(self.refresh_seconds)
+                delay = SNAPSHOT_FOLLOW_SECONDS if self.follow else self.due_in()
+            except Exception as ex:
+                LOGGER.error(f"Snapshot refresh failed with {ex}")
+                delay = SNAPSHOT_FOLLOW_SECONDS if self.follow else self.refresh_seconds
+            await asyncio.sleep(delay)
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+
+snapshots = SnapshotEngine(
+    refresh_seconds=SNAPSHOT_REFRESH_MINUTES * 60,
+    path=SNAPSHOT_PATH,
+    follow=SNAPSHOT_FOLLOW,
+)
@@ -1,41 +1,260 @@
 import asyncio
+import random
+import time
 
 import discord
-from discord.ext import tasks
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Sequence
 
-from .settings import BOT_TICKER_INTERVAL_MINUTES
+from .helpers import LOGGER
+from .metrics import RollingWindow
+from .snapshot import snapshots
+from .settings import (
+    BOT_TICKER_INTERVAL_MINUTES,
+    NICK_UPDATE_SPREAD,
+    NICK_UPDATE_CONCURRENCY,
+    TICKER_FORCE_REFRESH_MINUTES,
+    TICKER_PREFETCH_SECONDS,
+    TICKER_START_JITTER_SECONDS,
+    TICKER_LATENCY_WINDOW,
+)
+
+
+@dataclass(frozen=True)
+class Published:
+    """Nick or presence last pushed to Discord"""
+
+    text: str
+    # number behind the text, if any, for significance checks
+    value: Optional[float]
+    published_at: float
+
+    @classmethod
+    def now(cls, text: str, value: Optional[float]) -> "Published":
+        return Published(text=text, value=value, published_at=time.monotonic())
+
+    def is_outdated_by(
+        self, text: str, value: Optional[float], threshold: float
+    ) -> bool:
+        """Whether text (and value) are worth publishing over this
+
+        Args:
+            text (str): new text
+            value (Optional[float]): number behind the new text
+            threshold (float): min relative change of value to publish,
+            only applies when both values are known
+
+        Returns:
+            bool: True when changed enough or this is due a forced refresh
+        """
+        if time.monotonic() - self.published_at >= TICKER_FORCE_REFRESH_MINUTES * 60:
+            return True
+        if text == self.text:
+            return False
+        if value is None or self.value is None or not threshold:
+            return True
+        if self.value == 0:
+            return value != 0
+        return abs(value - self.value) / abs(self.value) >= threshold
+
+
+class NickUpdater:
+    """Keeps the bot's nick in sync across guilds without bursting REST calls
+
+    Guilds where the cached bot member (guild.me) already has the nick, or
+    where the last nick we set there is still good enough, are skipped. The
+    rest get edited spread over a window, a few at a time. discord.py waits
+    out rate limit buckets, edits that still fail are retried on the next
+    update.
+    """
+
+    def __init__(
+        self, window_seconds: float, concurrency: int, significance_threshold: float
+    ):
+        self.window_seconds = window_seconds
+        self.concurrency = concurrency
+        self.significance_threshold = significance_threshold
+        # guild id => nick last set there
+        self.published: Dict[int, Published] = {}
+        # REST calls made by the last update
+        self.rest_calls = 0
+
+    def is_stale(self, guild: discord.Guild, nick: str, value: Optional[float]) -> bool:
+        if guild.me is None:
+            return False
+
+        last = self.published.get(guild.id)
+        if last is None:
+            if guild.me.nick != nick:
+                return True
+            # already there, e.g. after a restart
+            self.published[guild.id] = Published.now(nick, value)
+            return False
+
+        return last.is_outdated_by(nick, value, self.significance_threshold)
+
+    async def update(
+        self,
+        guilds: Sequence[discord.Guild],
+        nick: str,
+        value: Optional[float] = None,
+        on_edit: Callable[[], None] = lambda: None,
+    ) -> int:
+        """Set nick in all guilds where it is outdated
+
+        Args:
+            guilds (Sequence[discord.Guild]): guilds the bot is in
+            nick (str): nick to set
+            value (Optional[float], optional): number shown in the nick, for
+            significance checks. Defaults to None.
+            on_edit (Callable, optional): called after each successful edit.
+
+        Returns:
+            int: number of REST calls made
+        """
+        stale = list(filter(lambda guild: self.is_stale(guild, nick, value), guilds))
+        delay = self.window_seconds / len(stale) if stale else 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def edit(position: int, guild: discord.Guild) -> bool:
+            await asyncio.sleep(position * delay)
+            async with semaphore:
+                try:
+                    await guild.me.edit(nick=nick)
+                    self.published[guild.id] = Published.now(nick, value)
+                    on_edit()
+                    return True
+                except discord.HTTPException as ex:
+                    LOGGER.warning(f"Nick update in {guild.id} failed with {ex}")
+                    return False
+
+        results = await asyncio.gather(*map(edit, range(len(stale)), stale))
+
+        self.rest_calls = len(stale)
+        LOGGER.debug(
+            f"Nick updated in {sum(results)}/{len(stale)} guilds, "
+            f"{len(guilds) - len(stale)} up to date, {self.rest_calls} REST calls"
+        )
+        return self.rest_calls
+
+
+class TickScheduler:
+    """Fires ticks every interval from a jittered start, running prefetch a
+    bit ahead of each one so ticks find their data ready
+
+    Tick latency, from when a tick was due to its first Discord update going
+    through (see mark_update), is kept in latency.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        prefetch_seconds: float,
+        jitter_seconds: float,
+        prefetch: Callable[[], Awaitable],
+        tick: Callable[[], Awaitable],
+    ):
+        self.interval_seconds = interval_seconds
+        self.prefetch_seconds = prefetch_seconds
+        self.jitter_seconds = jitter_seconds
+        self.prefetch = prefetch
+        self.tick = tick
+        self.latency = RollingWindow(TICKER_LATENCY_WINDOW)
+        self._fired_at: Optional[float] = None
+
+    def mark_update(self):
+        """Record tick latency once a Discord update went through, only the
+        first one of a tick counts"""
+        if self._fired_at is None:
+            return
+        latency = asyncio.get_running_loop().time() - self._fired_at
+        self._fired_at = None
+        self.latency.add(latency)
+        LOGGER.debug(f"Tick latency {latency * 1000:.0f}ms")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        fire_at = loop.time() + random.uniform(0, self.jitter_seconds)  # noqa: S311
+
+        while True:
+            await asyncio.sleep(fire_at - self.prefetch_seconds - loop.time())
+            try:
+                await self.prefetch()
+            except Exception as ex:
+                LOGGER.warning(f"Prefetch failed with {ex}")
+
+            await asyncio.sleep(fire_at - loop.time())
+            self._fired_at = fire_at
+            try:
+                await self.tick()
+            except Exception as ex:
+                LOGGER.error(f"Ticker failed with {ex}")
+            self._fired_at = None
+
+            fire_at += self.interval_seconds
+            while fire_at < loop.time():
+                # skip ticks missed while this one ran long
+                fire_at += self.interval_seconds
 
 
 class TickerBot(discord.Client):
-    """Base bot class for tickers: periodically update nick + presence"""
+    """Base bot class for tickers: periodically update nick + presence
+
+    Updates that would not change what is shown get skipped, as do ones with
+    values moving less than significance_threshold (relative change), up
+    until TICKER_FORCE_REFRESH_MINUTES since the last one.
+    """
+
+    significance_threshold: float = 0
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs, intents=discord.Intents.default())
+        self.nick_updater = NickUpdater(
+            BOT_TICKER_INTERVAL_MINUTES * 60 * NICK_UPDATE_SPREAD,
+            NICK_UPDATE_CONCURRENCY,
+            self.significance_threshold,
+        )
+        self.presence: Optional[Published] = None
+        self.ticks = TickScheduler(
+            BOT_TICKER_INTERVAL_MINUTES * 60,
+            TICKER_PREFETCH_SECONDS,
+            TICKER_START_JITTER_SECONDS,
+            self.prefetch,
+            self.ticker,
+        )
+        self._ticking: Optional[asyncio.Task] = None
 
     async def setup_hook(self) -> None:
         # start the task to run in the background
-        self.ticker.start()
+        self._ticking = asyncio.create_task(self.run_ticker())
 
-    async def update_bot_member_nick(self, guild, nick: str):
-        bot_member = await guild.fetch_member(self.user.id)
-        if bot_member is None:
-            return
-        await bot_member.edit(nick=nick)
+    async def run_ticker(self):
+        # wait until the bot logs in
+        await self.wait_until_ready()
+        await self.ticks.run()
 
-    async def update_nick_for_all_servers(self, nick: str):
-        await asyncio.gather(
-            *map(lambda guild: self.update_bot_member_nick(guild, nick), self.guilds)
+    async def prefetch(self):
+        """Get data the next tick needs ready, by default a fresh snapshot"""
+        # refreshed on the engine's schedule, just ahead of it when a tick
+        # lands right before the snapshot is due
+        await snapshots.get_fresh(snapshots.refresh_seconds - TICKER_PREFETCH_SECONDS)
+
+    async def update_nick_for_all_servers(
+        self, nick: str, value: Optional[float] = None
+    ):
+        await self.nick_updater.update(
+            self.guilds, nick, value, on_edit=self.ticks.mark_update
         )
 
-    async def update_presence(self, presence_text: str):
+    async def update_presence(self, presence_text: str, value: Optional[float] = None):
+        if self.presence is not None and not self.presence.is_outdated_by(
+            presence_text, value, self.significance_threshold
+        ):
+            return
         # https://discordpy.readthedocs.io/en/latest/api.html#discord.ActivityType
         await self.change_presence(activity=discord.CustomActivity(name=presence_text))
+        self.presence = Published.now(presence_text, value)
+        self.ticks.mark_update()
 
-    @tasks.loop(seconds=BOT_TICKER_INTERVAL_MINUTES * 60)
     async def ticker(self):
         raise NotImplementedError
-
-    @ticker.before_loop
-    async def before_my_task(self):
-        # wait until the bot logs in
-        await self.wait_until_ready()
@@ -1,7 +1,4 @@
-from discord.ext import tasks
-
-from .settings import BOT_TICKER_INTERVAL_MINUTES
-from .data import LiquidityPool, Token
+from .snapshot import snapshots
 from .helpers import LOGGER, amount_to_m_string
 from .ticker import TickerBot
 
@@ -18,13 +15,12 @@ class TVLBot(TickerBot):
         LOGGER.debug("------")
         await self.update_presence(f"TVL {self.protocol_name}")
 
-    @tasks.loop(seconds=BOT_TICKER_INTERVAL_MINUTES * 60)
     async def ticker(self):
         try:
-            pools = await LiquidityPool.get_pools()
-            tvl = await LiquidityPool.tvl(pools)
-            tokens = await Token.get_all_listed_tokens()
-            await self.update_nick_for_all_servers(f"TVL ~${amount_to_m_string(tvl)}")
-            await self.update_presence(f"Based on {len(tokens)} listed tokens")
+            snapshot = await snapshots.get()
+            await self.update_nick_for_all_servers(
+                f"TVL ~${amount_to_m_string(snapshot.tvl)}"
+            )
+            await self.update_presence(f"Based on {len(snapshot.tokens)} listed tokens")
         except Exception as ex:
             LOGGER.error(f"Ticker failed with {ex}")
@@ -1,3 +1,3 @@
 from .pools import PoolsDropdown  # noqa
 from .pool_stats import PoolStats  # noqa
-from .emojis import Emojis  # noqa
+from .emojis import Emojis, emojis_cache  # noqa
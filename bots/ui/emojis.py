@@ -1,4 +1,4 @@
-from typing import Sequence
+from typing import Optional, Sequence
 from discord import Emoji
 
 
@@ -28,3 +28,28 @@ class Emojis:
             str: _description_
         """
         return self.emojis[name] if name in self.emojis else fallback
+
+
+class EmojisCache:
+    """Keeps the Emojis map around instead of rebuilding it on every render,
+    invalidate it when emojis change (on_guild_emojis_update)
+
+    Bots use their custom emojis from any of their servers, so one map
+    covers all guilds; version goes into keys of anything rendered with it.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._emojis: Optional[Emojis] = None
+
+    def get(self, emojis: Sequence[Emoji]) -> Emojis:
+        if self._emojis is None:
+            self._emojis = Emojis(emojis)
+        return self._emojis
+
+    def invalidate(self):
+        self.version += 1
+        self._emojis = None
+
+
+emojis_cache = EmojisCache()
@@ -1,31 +1,74 @@
-from typing import Sequence
+import collections
+
+from typing import ClassVar, Optional, OrderedDict, Sequence, Tuple
 import discord
 from ..data import LiquidityPool, LiquidityPoolEpoch
 from ..helpers import format_percentage, format_currency, make_app_url
-from ..settings import APP_BASE_URL, UI_POOL_STATS_THUMBNAIL, PROTOCOL_NAME
-from .emojis import Emojis
+from ..settings import (
+    APP_BASE_URL,
+    UI_POOL_STATS_THUMBNAIL,
+    PROTOCOL_NAME,
+    RENDER_CACHE_SIZE,
+)
+from .emojis import emojis_cache
 
 
 class PoolStats:
     """Pool stats embded UI to visualize a pool;
     for it to look nice make sure you load custom emojis to your Discord server"""
 
+    # rendered embeds by (pool address id, snapshot key, emojis version),
+    # least recently used first
+    _rendered: ClassVar[
+        OrderedDict[Tuple[int, Tuple[int, int], int], discord.Embed]
+    ] = collections.OrderedDict()
+
     def __init__(self, emojis: Sequence[discord.Emoji]):
-        self.emojis = Emojis(emojis)
+        self.emojis = emojis_cache.get(emojis)
 
     async def render(
-        self, pool: LiquidityPool, tvl: float, pool_epoch: LiquidityPoolEpoch
+        self,
+        pool: LiquidityPool,
+        tvl: float,
+        pool_epoch: LiquidityPoolEpoch,
+        snapshot_key: Optional[Tuple[int, int]] = None,
+        apr: Optional[float] = None,
     ) -> discord.Embed:
         """renders pool stats into a discord.Embed
 
+        Embeds for pools from a snapshot (snapshot_key given) are reused
+        until the snapshot or the emojis change. APR gets computed from
+        the pool unless given.
+
         Returns:
             discord.Embed: discord embed UI ready to be sent
         """
+        if apr is None:
+            apr = pool.apr(tvl)
+        if snapshot_key is None:
+            return self._render(pool, tvl, apr, pool_epoch)
+
+        key = (pool.lp_id, snapshot_key, emojis_cache.version)
+        if key in self._rendered:
+            self._rendered.move_to_end(key)
+            return self._rendered[key]
+
+        embed = self._render(pool, tvl, apr, pool_epoch)
+        self._rendered[key] = embed
+        if len(self._rendered) > RENDER_CACHE_SIZE:
+            self._rendered.popitem(last=False)
+        return embed
+
+    def _render(
+        self,
+        pool: LiquidityPool,
+        tvl: float,
+        apr: float,
+        pool_epoch: LiquidityPoolEpoch,
+    ) -> discord.Embed:
         token0_fees = pool.token0_fees.amount_in_stable if pool.token0_fees else 0
         token1_fees = pool.token1_fees.amount_in_stable if pool.token1_fees else 0
 
-        apr = pool.apr(tvl)
-
         deposit_url = make_app_url(
             APP_BASE_URL,
             "/deposit",
@@ -1,7 +1,10 @@
+import functools
+
 from typing import List, Callable, Awaitable
 import discord
 from ..data import LiquidityPool
-from .emojis import Emojis
+from ..settings import RENDER_CACHE_SIZE
+from .emojis import emojis_cache
 
 intents = discord.Intents.default()
 intents.message_content = True
@@ -10,10 +13,13 @@ intents.message_content = True
 def build_select_option(
     interaction: discord.Interaction, pool: LiquidityPool
 ) -> discord.SelectOption:
-    emojis = Emojis(interaction.client.emojis)
-    return discord.SelectOption(
-        label=pool.symbol, value=pool.lp, emoji=emojis.get("pool", "🏊‍♀️")
-    )
+    emojis = emojis_cache.get(interaction.client.emojis)
+    return _select_option(pool.symbol, pool.lp, emojis.get("pool", "🏊‍♀️"))
+
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _select_option(label: str, value: str, emoji: str) -> discord.SelectOption:
+    return discord.SelectOption(label=label, value=value, emoji=emoji)
 
 
 class _PoolsDropdown(discord.ui.Select):
@@ -0,0 +1,70 @@
+import pytest
+import pytest_asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv(".env.example")
+
+from bots import data, rpc  # noqa
+from tests.synthetic import FakeNode  # noqa
+
+CACHED = [
+    data.Token.get_all_tokens,
+    data.Token.get_all_listed_tokens,
+    data.LiquidityPool.get_pools,
+    data.LiquidityPoolEpoch.fetch_latest,
+]
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        help="run benchmarks asserting on wall-clock timings",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: wall-clock timing checks, run with --benchmark"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    # timings depend on the machine, shared CI runners would make them flaky
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmark")
+    for item in filter(lambda item: "benchmark" in item.keywords, items):
+        item.add_marker(skip)
+
+
+async def serve(monkeypatch, fake_node: FakeNode):
+    for fn in CACHED:
+        fn.cache_clear()
+    monkeypatch.setattr(data.LiquidityPool, "_pool_count_hint", 0)
+    monkeypatch.setattr(data.Price, "_stores", {})
+
+    async with fake_node:
+        provider = rpc.RoutedHTTPProvider([fake_node.url])
+        monkeypatch.setattr(rpc.w3, "provider", provider)
+        yield fake_node
+        await provider.close()
+
+    for fn in CACHED:
+        fn.cache_clear()
+
+
+@pytest_asyncio.fixture
+async def node(monkeypatch):
+    """Point bots at a local stand-in node with synthetic Sugar data"""
+    async for fake_node in serve(monkeypatch, FakeNode()):
+        yield fake_node
+
+
+@pytest_asyncio.fixture
+async def big_remote_node(monkeypatch):
+    """Stand-in node with 10k pools, served from its own process"""
+    fake_node = FakeNode(pools=10_000, separate_process=True)
+    async for fake_node in serve(monkeypatch, fake_node):
+        yield fake_node
@@ -0,0 +1,348 @@
+"""Synthetic Sugar data for offline tests and benchmarks"""
+
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+
+from aiohttp import web
+from eth_abi import decode, encode
+from eth_utils import function_abi_to_4byte_selector
+from typing import Any, Callable, Dict, List, Tuple
+
+from bots.data import Token, Price, LiquidityPool
+from bots.helpers import normalize_address
+from bots.settings import LP_SUGAR_ABI, PRICE_ORACLE_ABI
+
+SYMBOLS = ["USDC", "WETH", "VELO", "OP", "DAI", "WBTC", "LUSD", "SNX", "USDT", "FRAX"]
+
+
+def make_address(prefix: int, index: int) -> str:
+    return normalize_address(f"0x{prefix:02x}{index:038x}")
+
+
+def make_token_tuples(count: int) -> List[Tuple]:
+    return [
+        (
+            make_address(1, i),
+            SYMBOLS[i] if i < len(SYMBOLS) else f"TKN{i}",
+            6 if i % 3 == 0 else 18,
+            0,
+            True,
+        )
+        for i in range(count)
+    ]
+
+
+def make_pool_tuples(count: int, token_tuples: List[Tuple], seed: int = 42):
+    rnd = random.Random(seed)  # noqa: S311
+    pools = []
+
+    for i in range(count):
+        t0, t1 = rnd.sample(token_tuples, 2)
+        stable = i % 4 == 0
+        symbol = f"{'s' if stable else 'v'}AMM-{t0[1]}/{t1[1]}"
+        total_supply = rnd.randint(10**18, 10**24)
+        emissions_token = token_tuples[2][0]
+
+        pools.append(
+            (
+                make_address(2, i),  # lp
+                symbol,
+                18,  # decimals
+                total_supply,  # liquidity
+                0 if stable else -1,  # type
+                0,  # tick
+                0,  # sqrt_ratio
+                t0[0],  # token0
+                rnd.randint(0, 10**7) * 10 ** t0[2],  # reserve0
+                0,  # staked0
+                t1[0],  # token1
+                rnd.randint(0, 10**7) * 10 ** t1[2],  # reserve1
+                0,  # staked1
+                make_address(3, i),  # gauge
+                rnd.randint(0, total_supply),  # gauge_liquidity
+                True,  # gauge_alive
+                make_address(4, i),  # fee
+                make_address(5, i),  # bribe
+                make_address(6, 0),  # factory
+                rnd.randint(0, 10**16),  # emissions
+                emissions_token,  # emissions_token
+                rnd.choice([1, 5, 30, 100]),  # pool_fee
+                0,  # unstaked_fee
+                rnd.randint(0, 10**4) * 10 ** t0[2],  # token0_fees
+                rnd.randint(0, 10**4) * 10 ** t1[2],  # token1_fees
+            )
+        )
+
+    return pools
+
+
+def make_epoch_tuples(pool_tuples: List[Tuple], seed: int = 42):
+    rnd = random.Random(seed)  # noqa: S311
+    return [
+        (
+            0,  # ts
+            p[0],  # lp
+            0,  # votes
+            0,  # emissions
+            [(p[7], rnd.randint(0, 10**20))],  # bribes
+            [
+                (p[7], rnd.randint(0, 10**20)),
+                (p[10], rnd.randint(0, 10**20)),
+            ],  # fees
+        )
+        for p in pool_tuples
+    ]
+
+
+def make_prices(token_tuples: List[Tuple], seed: int = 42) -> List[int]:
+    rnd = random.Random(seed)  # noqa: S311
+    return [rnd.randint(10**15, 10**21) for _ in token_tuples]
+
+
+def _abi_type(param: dict) -> str:
+    if not param["type"].startswith("tuple"):
+        return param["type"]
+    inner = ",".join(map(_abi_type, param["components"]))
+    return f"({inner}){param['type'][len('tuple'):]}"
+
+
+class NodeError(Exception):
+    """Answered as a JSON-RPC error"""
+
+
+class FakeNode:
+    """Stand-in JSON-RPC node serving Sugar and oracle calls from synthetic data"""
+
+    def __init__(
+        self,
+        tokens: int = 50,
+        pools: int = 1234,
+        delay: float = 0,
+        separate_process: bool = False,
+    ):
+        self.token_tuples = make_token_tuples(tokens)
+        self.pool_tuples = make_pool_tuples(pools, self.token_tuples)
+        self.epoch_tuples = make_epoch_tuples(self.pool_tuples)
+        self.prices = dict(
+            zip(
+                map(lambda t: t[0].lower(), self.token_tuples),
+                make_prices(self.token_tuples),
+                strict=True,
+            )
+        )
+        self.block_number = 100
+        self.delay = delay
+        # serve from a process of its own so the node's work doesn't compete
+        # with the client for the event loop or the GIL, requests made there
+        # aren't recorded here
+        self.separate_process = separate_process
+        self.failing = False
+        # hold requests unanswered, until unpaused
+        self.paused = False
+        self.max_batch_size = None
+        self.requests: List[Tuple[str, list]] = []
+        # (block number, pool address) of emitted pool events
+        self.logs: List[Tuple[int, str]] = []
+        self.http_requests = 0
+        self.functions = {}
+
+        for abi in (LP_SUGAR_ABI, PRICE_ORACLE_ABI):
+            for fn in filter(lambda e: e.get("type") == "function", json.loads(abi)):
+                self.functions[function_abi_to_4byte_selector(fn)] = (
+                    fn["name"],
+                    list(map(_abi_type, fn["inputs"])),
+                    list(map(_abi_type, fn["outputs"])),
+                )
+
+    async def __aenter__(self) -> "FakeNode":
+        if not self.separate_process:
+            await self._start()
+            return self
+
+        urls = multiprocessing.get_context("fork").Queue()
+        self._process = multiprocessing.get_context("fork").Process(
+            target=self._serve_forever, args=(urls,), daemon=True
+        )
+        self._process.start()
+        self.url = await asyncio.to_thread(urls.get, timeout=30)
+        return self
+
+    async def __aexit__(self, *args):
+        if not self.separate_process:
+            await self._runner.cleanup()
+            return
+
+        self._process.terminate()
+        await asyncio.to_thread(self._process.join)
+
+    def _serve_forever(self, urls):
+        async def serve():
+            await self._start()
+            urls.put(self.url)
+            await asyncio.Event().wait()
+
+        asyncio.run(serve())
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/"
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.http_requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        while self.paused:
+            await asyncio.sleep(0.005)
+        if self.failing:
+            return web.Response(status=503)
+
+        body = await request.json()
+        if isinstance(body, list):
+            if self.max_batch_size and len(body) > self.max_batch_size:
+                return web.json_response(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": None,
+                        "error": {"code": -32600, "message": "batch too large"},
+                    }
+                )
+            return web.json_response(list(map(self._respond, body)))
+        return web.json_response(self._respond(body))
+
+    def _respond(self, payload: dict) -> dict:
+        method, params = payload["method"], payload.get("params", [])
+        self.requests.append((method, params))
+        try:
+            result = getattr(self, method)(*params)
+        except NodeError as ex:
+            error = {"code": -32000, "message": str(ex)}
+            return {"jsonrpc": "2.0", "id": payload["id"], "error": error}
+        return {"jsonrpc": "2.0", "id": payload["id"], "result": result}
+
+    def eth_chainId(self):
+        return hex(10)
+
+    def eth_blockNumber(self):
+        return hex(self.block_number)
+
+    def eth_call(self, tx: dict, block_identifier="latest"):
+        if (
+            block_identifier != "latest"
+            and int(block_identifier, 16) > self.block_number
+        ):
+            raise NodeError("header not found")
+        data = bytes.fromhex(tx["data"][2:])
+        name, input_types, output_types = self.functions[data[:4]]
+        args = decode(input_types, data[4:])
+        result = getattr(self, f"_call_{name}")(*args)
+        return "0x" + encode(output_types, [result]).hex()
+
+    def eth_getLogs(self, log_filter: dict):
+        from_block, to_block = (
+            int(log_filter["fromBlock"], 16),
+            int(log_filter["toBlock"], 16),
+        )
+        addresses = set(map(str.lower, log_filter.get("address", [])))
+        return [
+            {
+                "address": address,
+                "topics": [log_filter["topics"][0][0]],
+                "data": "0x",
+                "blockNumber": hex(block_number),
+                "blockHash": "0x" + "00" * 32,
+                "transactionHash": "0x" + "00" * 32,
+                "transactionIndex": "0x0",
+                "logIndex": hex(i),
+                "removed": False,
+            }
+            for i, (block_number, address) in enumerate(self.logs)
+            if from_block <= block_number <= to_block
+            and (not addresses or address.lower() in addresses)
+        ]
+
+    def update_pool(self, index: int, **changes):
+        """Change pool fields by Sugar name and emit a pool event for it"""
+        self._update(index, 0, changes)
+
+    def update_gauge(self, index: int, **changes):
+        """Change pool fields by Sugar name and emit a gauge event for it"""
+        self._update(index, 13, changes)
+
+    def _update(self, index: int, emitter: int, changes: dict):
+        fields = {
+            "reserve0": 8,
+            "reserve1": 11,
+            "gauge_liquidity": 14,
+            "emissions": 19,
+            "token0_fees": 23,
+        }
+        pool = list(self.pool_tuples[index])
+        for name, value in changes.items():
+            pool[fields[name]] = value
+        self.pool_tuples[index] = tuple(pool)
+        self.logs.append((self.block_number, pool[emitter]))
+
+    def eth_calls(self) -> List[str]:
+        return [
+            self.functions[bytes.fromhex(params[0]["data"][2:10])][0]
+            for method, params in self.requests
+            if method == "eth_call"
+        ]
+
+    def _call_tokens(self, limit, offset, account, addresses):
+        return self.token_tuples[offset : offset + limit]
+
+    def _call_all(self, limit, offset):
+        return self.pool_tuples[offset : offset + limit]
+
+    def _call_byIndex(self, index):
+        return self.pool_tuples[index]
+
+    def _call_epochsLatest(self, limit, offset):
+        return self.epoch_tuples[offset : offset + limit]
+
+    def _call_getManyRatesWithConnectors(self, src_len, connectors):
+        return [self.prices.get(t.lower(), 0) for t in connectors[:src_len]]
+
+
+def make_token_maps(token_tuples: List[Tuple]) -> Tuple[Dict, Dict]:
+    """Tokens and their prices by address id, as pools get decoded with"""
+    tokens = {t.token_id: t for t in map(Token.from_tuple, token_tuples)}
+    prices = {
+        address: Price(token=token, price=price / 10**18)
+        for (address, token), price in zip(
+            tokens.items(), make_prices(token_tuples), strict=True
+        )
+    }
+    return tokens, prices
+
+
+def make_pool_inputs(count: int, tokens: int = 50) -> Tuple[List, Dict, Dict]:
+    """Sugar pool tuples, plus the token and price maps to decode them with"""
+    token_tuples = make_token_tuples(tokens)
+    return (make_pool_tuples(count, token_tuples), *make_token_maps(token_tuples))
+
+
+def make_pools(count: int, tokens: int = 50) -> List:
+    """Decode synthetic Sugar tuples into LiquidityPool objects"""
+    pool_tuples, tokens, prices = make_pool_inputs(count, tokens)
+    return [LiquidityPool.from_tuple(t, tokens, prices) for t in pool_tuples]
+
+
+def best_of(fn: Callable[[], Any], rounds: int = 5) -> Tuple[Any, float]:
+    """Run fn a few times, for its result and fastest run in seconds"""
+    timings = []
+    for _ in range(rounds):
+        started_at = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started_at)
+    return result, min(timings)
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from bots.cache import cache_stale_while_revalidate, BatchCache
+
+
+def make_counter(ttl: float, max_stale: float, delay: float = 0.01):
+    calls = []
+
+    @cache_stale_while_revalidate(ttl, max_stale)
+    async def fetch(key: str):
+        calls.append(key)
+        await asyncio.sleep(delay)
+        return f"{key}-{len(calls)}"
+
+    return fetch, calls
+
+
+@pytest.mark.asyncio
+async def test_single_flight_on_miss():
+    fetch, calls = make_counter(ttl=10, max_stale=20)
+    results = await asyncio.gather(*[fetch("a") for _ in range(10)])
+
+    assert results == ["a-1"] * 10
+    assert calls == ["a"]
+    stats = fetch.cache_stats()[("a",)]
+    assert stats.misses == 10
+    assert stats.refreshes == 1
+
+
+@pytest.mark.asyncio
+async def test_serves_stale_while_refreshing():
+    fetch, calls = make_counter(ttl=0.05, max_stale=10)
+    assert await fetch("a") == "a-1"
+    await asyncio.sleep(0.06)
+
+    # stale value comes back immediately, refresh runs in the background
+    assert await fetch("a") == "a-1"
+    assert await fetch("a") == "a-1"
+    await asyncio.sleep(0.02)
+    assert await fetch("a") == "a-2"
+
+    stats = fetch.cache_stats()[("a",)]
+    assert stats.stale_hits == 2
+    assert stats.hits == 1
+    assert stats.refreshes == 2
+    assert stats.last_refresh_seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_waits_past_max_staleness():
+    fetch, calls = make_counter(ttl=0.01, max_stale=0.02)
+    assert await fetch("a") == "a-1"
+    await asyncio.sleep(0.03)
+
+    assert await fetch("a") == "a-2"
+    assert fetch.cache_stats()[("a",)].stale_hits == 0
+
+
+@pytest.mark.asyncio
+async def test_never_serves_past_max_staleness():
+    calls = []
+
+    @cache_stale_while_revalidate(0.01, 0.02)
+    async def fetch():
+        calls.append(1)
+        if len(calls) == 2:
+            raise asyncio.TimeoutError()
+        return f"good-{len(calls)}"
+
+    assert await fetch() == "good-1"
+    await asyncio.sleep(0.03)
+
+    # the failed refresh is raised, the old value is gone for good
+    with pytest.raises(asyncio.TimeoutError):
+        await fetch()
+    assert await fetch() == "good-3"
+    stats = fetch.cache_stats()[()]
+    assert stats.refresh_errors == 1
+    assert stats.misses == 3
+
+
+@pytest.mark.asyncio
+async def test_evicts_values_past_max_staleness():
+    fetch, calls = make_counter(ttl=0.01, max_stale=0.02)
+    await fetch("a")
+    await asyncio.sleep(0.03)
+
+    await fetch("b")
+    assert list(fetch.cache_stats()) == [("b",)]
+
+
+def make_batch_cache(ttl: float, max_stale: float, delay: float = 0.01):
+    calls = []
+
+    async def fetch_many(keys):
+        calls.append(keys)
+        count = len(calls)
+        await asyncio.sleep(delay)
+        return {key: f"{key}-{count}" for key in keys}
+
+    return BatchCache(fetch_many, ttl, max_stale), calls
+
+
+@pytest.mark.asyncio
+async def test_batch_cache_fetches_only_misses():
+    cache, calls = make_batch_cache(ttl=10, max_stale=20)
+
+    assert await cache.get_many(["a", "b"]) == {"a": "a-1", "b": "b-1"}
+    assert await cache.get_many(["b", "c", "d", "c"]) == {
+        "b": "b-1",
+        "c": "c-2",
+        "d": "d-2",
+    }
+    assert calls == [["a", "b"], ["c", "d"]]
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 4
+    assert cache.hit_ratio == 1 / 5
+
+
+@pytest.mark.asyncio
+async def test_batch_cache_shares_in_flight_fetches():
+    cache, calls = make_batch_cache(ttl=10, max_stale=20)
+
+    results = await asyncio.gather(
+        cache.get_many(["a", "b"]), cache.get_many(["b", "c"])
+    )
+
+    assert results == [{"a": "a-1", "b": "b-1"}, {"b": "b-1", "c": "c-2"}]
+    assert calls == [["a", "b"], ["c"]]
+
+
+@pytest.mark.asyncio
+async def test_batch_cache_refreshes_stale_with_misses():
+    cache, calls = make_batch_cache(ttl=0.05, max_stale=10)
+    await cache.get_many(["a"])
+    await asyncio.sleep(0.06)
+
+    # stale "a" comes back as is but gets refreshed along with the miss
+    assert await cache.get_many(["a", "b"]) == {"a": "a-1", "b": "b-2"}
+    assert calls == [["a"], ["b", "a"]]
+    assert await cache.get_many(["a"]) == {"a": "a-2"}
+    assert cache.stats.stale_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_cache_never_serves_past_max_staleness():
+    calls = []
+
+    async def fetch_many(keys):
+        calls.append(keys)
+        if len(calls) > 1:
+            raise asyncio.TimeoutError()
+        return {key: "good" for key in keys}
+
+    cache = BatchCache(fetch_many, 0.01, 0.02)
+    assert await cache.get_many(["a"]) == {"a": "good"}
+    await asyncio.sleep(0.03)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await cache.get_many(["a"])
+    assert "a" not in cache.values
+    assert cache.stats.refresh_errors == 1
@@ -0,0 +1,98 @@
+import pytest
+
+from eth_abi import encode
+from eth_abi.exceptions import InsufficientDataBytes
+from eth_utils.abi import collapse_if_tuple
+from web3.constants import ADDRESS_ZERO
+
+from bots.data import (
+    SUGAR_TOKENS,
+    SUGAR_ALL,
+    SUGAR_BY_INDEX,
+    SUGAR_EPOCHS_LATEST,
+    ORACLE_RATES,
+)
+from bots.rpc import w3
+from bots.settings import (
+    LP_SUGAR_ADDRESS,
+    LP_SUGAR_ABI,
+    PRICE_ORACLE_ADDRESS,
+    PRICE_ORACLE_ABI,
+)
+from tests.synthetic import FakeNode, best_of
+
+
+@pytest.fixture(scope="module")
+def recorded():
+    """Responses, as a node would return them, per view and call arguments"""
+    node = FakeNode(pools=2000)
+    token = node.token_tuples[0][0]
+    calls = [
+        (SUGAR_TOKENS, (2000, 0, ADDRESS_ZERO, ()), node.token_tuples),
+        (SUGAR_ALL, (500, 0), node.pool_tuples[:500]),
+        (SUGAR_BY_INDEX, (7,), node.pool_tuples[7]),
+        (SUGAR_EPOCHS_LATEST, (2000, 0), node.epoch_tuples),
+        (ORACLE_RATES, (1, (token, token)), list(node.prices.values())),
+    ]
+    return [
+        (view, args, encode([_output_type(view)], [result]))
+        for view, args, result in calls
+    ]
+
+
+def _contract_function(view):
+    address, abi = (
+        (PRICE_ORACLE_ADDRESS, PRICE_ORACLE_ABI)
+        if view is ORACLE_RATES
+        else (LP_SUGAR_ADDRESS, LP_SUGAR_ABI)
+    )
+    return w3.eth.contract(address=address, abi=abi).get_function_by_name(view.name)
+
+
+def _output_type(view):
+    [output_type] = map(collapse_if_tuple, _contract_function(view).abi["outputs"])
+    return output_type
+
+
+def test_views_match_web3(recorded):
+    for view, args, response in recorded:
+        fn = _contract_function(view)
+        assert view(*args).data == fn(*args)._encode_transaction_data()
+        assert (
+            view.decode(response) == w3.codec.decode([_output_type(view)], response)[0]
+        )
+
+
+def test_views_reject_short_data(recorded):
+    # e.g. no contract at the address, or a block before it got deployed
+    for view, _, response in recorded:
+        for data in (b"", response[:32], response[:-32]):
+            with pytest.raises(InsufficientDataBytes):
+                view.decode(data)
+
+
+def test_views_benchmark(recorded):
+    """Encode and decode recorded responses: web3 contract path vs precompiled"""
+
+    def contract_path():
+        for view, args, response in recorded:
+            fn = _contract_function(view)
+            fn(*args)._encode_transaction_data()
+            output_types = list(map(collapse_if_tuple, fn.abi["outputs"]))
+            w3.codec.decode(output_types, response)
+
+    def precompiled():
+        for view, args, response in recorded:
+            view.decode(response)
+            view(*args).data
+
+    _, contract_seconds = best_of(contract_path)
+    _, precompiled_seconds = best_of(precompiled)
+
+    print(
+        f"\n{len(recorded)} Sugar and oracle calls: "
+        f"contract path {contract_seconds * 1000:.1f}ms, "
+        f"precompiled {precompiled_seconds * 1000:.1f}ms"
+    )
+
+    assert precompiled_seconds < contract_seconds
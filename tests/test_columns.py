@@ -0,0 +1,93 @@
+import pytest
+
+from bots.columns import PoolColumns
+from bots.data import LiquidityPool
+from tests.synthetic import best_of, make_pools, make_token_maps, make_token_tuples
+
+
+@pytest.fixture(scope="module")
+def pools():
+    return make_pools(10_000)
+
+
+@pytest.fixture(scope="module")
+def token_maps():
+    # same tokens and prices make_pools decodes pools with
+    return make_token_maps(make_token_tuples(50))
+
+
+def test_columns_match_object_api(pools, token_maps):
+    columns = PoolColumns.from_pools(pools, *token_maps)
+
+    for pool in pools[:500]:
+        row = columns.row(pool.lp)
+        tvl = (pool.reserve0.amount_in_stable if pool.token0 else 0) + (
+            pool.reserve1.amount_in_stable if pool.token1 else 0
+        )
+        assert columns.tvl[row] == pytest.approx(tvl)
+        assert columns.fees[row] == pytest.approx(pool.total_fees)
+        assert columns.volume[row] == pytest.approx(pool.volume)
+        assert columns.apr[row] == pytest.approx(pool.apr(tvl))
+
+    assert columns.total_fees == pytest.approx(sum(map(lambda p: p.total_fees, pools)))
+
+
+def test_columns_leave_unlisted_tokens_out(pools, token_maps):
+    tokens, prices = token_maps
+    listed = dict(list(tokens.items())[1:])
+    pools = list(
+        map(lambda p: LiquidityPool.from_tuple(p.to_tuple(), listed, prices), pools)
+    )
+    columns = PoolColumns.from_pools(pools, listed, prices)
+
+    for pool in pools[:500]:
+        row = columns.row(pool.lp)
+        assert columns.reserve0[row] == pytest.approx(
+            pool.reserve0.amount if pool.token0 else 0
+        )
+        assert columns.fees[row] == pytest.approx(pool.total_fees)
+    assert columns.total_tvl == pytest.approx(
+        sum(
+            map(
+                lambda p: (p.reserve0.amount_in_stable if p.token0 else 0)
+                + (p.reserve1.amount_in_stable if p.token1 else 0),
+                pools,
+            )
+        )
+    )
+
+
+def test_columns_benchmark(pools, token_maps):
+    """Protocol-wide metrics over 10k pools: object API vs vectorized columns"""
+
+    def objects():
+        total_tvl = total_fees = total_volume = 0
+        for pool in pools:
+            tvl = pool.reserve0.amount_in_stable + pool.reserve1.amount_in_stable
+            total_tvl += tvl
+            total_fees += pool.total_fees
+            total_volume += pool.volume
+            pool.apr(tvl)
+        return total_tvl, total_fees, total_volume
+
+    def vectorized():
+        # fresh columns each round, building them is part of the cost
+        columns = PoolColumns.from_pools(pools, *token_maps)
+        columns.apr
+        return columns.total_tvl, columns.total_fees, columns.total_volume
+
+    objects_result, objects_seconds = best_of(objects)
+    columns_result, columns_seconds = best_of(vectorized)
+    columns = PoolColumns.from_pools(pools, *token_maps)
+    _, aggregate_seconds = best_of(
+        lambda: (columns.tvl.sum(), columns.fees.sum(), columns.volume.sum())
+    )
+
+    print(
+        f"\n10k pools: objects {objects_seconds * 1000:.1f}ms, "
+        f"columns incl. build {columns_seconds * 1000:.1f}ms, "
+        f"columns aggregate only {aggregate_seconds * 1000:.2f}ms"
+    )
+
+    assert columns_result == pytest.approx(objects_result)
+    assert aggregate_seconds < objects_seconds
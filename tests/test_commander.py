@@ -0,0 +1,102 @@
+import asyncio
+import collections
+import dataclasses
+
+import pytest
+
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Optional
+
+from bots import commander
+from bots.snapshot import ProtocolSnapshot, SnapshotEngine
+from bots.ui import PoolStats
+
+
+class FakeResponse:
+    def __init__(self, delay: float, until: Optional[Callable[[], Awaitable]] = None):
+        self.delay = delay
+        # defer only completes once this is done
+        self.until = until
+        self.deferred = False
+
+    def is_done(self) -> bool:
+        return self.deferred
+
+    async def defer(self, thinking: bool = False):
+        await asyncio.sleep(self.delay)
+        if self.until is not None:
+            await self.until()
+        self.deferred = True
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, **kwargs):
+        self.sent.append(kwargs)
+
+
+@pytest.mark.asyncio
+async def test_select_pool_defers_while_loading(node, monkeypatch):
+    monkeypatch.setattr(commander, "snapshots", SnapshotEngine(refresh_seconds=60))
+    monkeypatch.setattr(commander, "pool_timings", commander.StageTimings(10))
+
+    async def snapshot_loading():
+        # deferring and loading the snapshot overlap, or this never returns
+        while not node.http_requests:
+            await asyncio.sleep(0.005)
+        node.paused = False
+
+    node.paused = True
+    interaction = SimpleNamespace(
+        response=FakeResponse(delay=0, until=snapshot_loading),
+        followup=FakeFollowup(),
+        client=SimpleNamespace(emojis=[]),
+    )
+
+    await asyncio.wait_for(
+        commander.on_select_pool(interaction, node.pool_tuples[0][0]), 10
+    )
+
+    [message] = interaction.followup.sent
+    assert node.pool_tuples[0][1] in message["embed"].fields[0].name
+
+    timings = commander.pool_timings.percentiles(100)
+    assert set(timings) == {"defer", "snapshot", "render", "reply", "total"}
+
+
+@pytest.mark.asyncio
+async def test_select_pool_reuses_rendered_embeds(node, monkeypatch):
+    monkeypatch.setattr(commander, "snapshots", SnapshotEngine(refresh_seconds=60))
+    monkeypatch.setattr(PoolStats, "_rendered", collections.OrderedDict())
+
+    async def select(address):
+        interaction = SimpleNamespace(
+            response=FakeResponse(delay=0),
+            followup=FakeFollowup(),
+            client=SimpleNamespace(emojis=[]),
+        )
+        await commander.on_select_pool(interaction, address)
+        [message] = interaction.followup.sent
+        return message["embed"]
+
+    first = await select(node.pool_tuples[0][0])
+    assert await select(node.pool_tuples[0][0]) is first
+    assert await select(node.pool_tuples[1][0]) is not first
+
+    commander.emojis_cache.invalidate()
+    first = await select(node.pool_tuples[0][0])
+    assert await select(node.pool_tuples[0][0]) is first
+
+    # a followed fetcher starting over can publish the same version again
+    snapshot = commander.snapshots.current
+    commander.snapshots._current = dataclasses.replace(
+        snapshot, block_number=snapshot.block_number + 1
+    )
+    assert await select(node.pool_tuples[0][0]) is not first
+
+    # pools gone from the current snapshot get rendered, not cached
+    gone = snapshot.pool(node.pool_tuples[0][0])
+    monkeypatch.setattr(ProtocolSnapshot, "pool", lambda self, address: None)
+    assert await select(gone) is not await select(gone)
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from bots import helpers
+from bots.helpers import paginate, AddressIndexed, AddressTable, addresses
+
+
+def make_fetcher(total: int, delay: float = 0.001):
+    stats = {"calls": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def fetch_page(limit: int, offset: int):
+        stats["calls"].append(offset)
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        # later pages come back first to make sure order is preserved
+        await asyncio.sleep(delay * (10 - offset // limit % 10))
+        stats["in_flight"] -= 1
+        return list(range(offset, min(offset + limit, total)))
+
+    return fetch_page, stats
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("expected_pages", [1, 3, 11, 50])
+async def test_paginate_keeps_order(expected_pages):
+    fetch_page, stats = make_fetcher(total=1234)
+    items = []
+
+    async for page in paginate(
+        fetch_page, page_size=100, max_in_flight=4, expected_pages=expected_pages
+    ):
+        items += page
+
+    assert items == list(range(1234))
+    assert stats["max_in_flight"] <= 4
+
+
+@pytest.mark.asyncio
+async def test_paginate_stops_on_short_page():
+    fetch_page, stats = make_fetcher(total=250)
+    pages = [page async for page in paginate(fetch_page, 100, 4, expected_pages=3)]
+
+    assert list(map(len, pages)) == [100, 100, 50]
+    assert sorted(stats["calls"]) == [0, 100, 200]
+
+
+def test_address_indexed():
+    items = [("0x4200000000000000000000000000000000000006", i) for i in range(3)] + [
+        ("0x7F5c764cBc14f9669B88837ca1490cCa17c31607", 3)
+    ]
+    indexed = AddressIndexed(items, key=lambda item: addresses.id(item[0]))
+
+    assert len(indexed) == 4
+    assert indexed.by_address("0x7f5c764cbc14f9669b88837ca1490cca17c31607")[1] == 3
+    # first match wins
+    assert indexed.by_address("0x4200000000000000000000000000000000000006")[1] == 0
+    assert indexed.by_address("0x0000000000000000000000000000000000000001") is None
+    assert indexed.by_address("not an address") is None
+
+
+def test_address_table(monkeypatch):
+    table = AddressTable()
+    checksums = []
+    to_checksum_address = helpers.to_checksum_address
+    monkeypatch.setattr(
+        helpers,
+        "to_checksum_address",
+        lambda address: checksums.append(address) or to_checksum_address(address),
+    )
+
+    usdc = table.id("0x7F5c764cBc14f9669B88837ca1490cCa17c31607")
+    assert table.id("0x7f5c764cbc14f9669b88837ca1490cca17c31607") == usdc
+    assert table.id("0x4200000000000000000000000000000000000006") == usdc + 1
+    assert table.find("0x0000000000000000000000000000000000000001") is None
+    assert len(table) == 2
+
+    for _ in range(3):
+        assert table.checksum(usdc) == "0x7F5c764cBc14f9669B88837ca1490cCa17c31607"
+    # checksummed once
+    assert len(checksums) == 1
@@ -0,0 +1,72 @@
+import time
+import tracemalloc
+
+import pytest
+
+from bots.data import Price, LiquidityPool
+from bots.helpers import addresses
+from bots.columns import PoolColumns
+from bots.search import PoolSearchIndex
+from tests.synthetic import make_pool_inputs
+
+
+def test_pool_views_are_built_on_access():
+    pool_tuples, tokens, prices = make_pool_inputs(10)
+    t = pool_tuples[3]
+    # addresses decoded outside of web3 calls come back lowercased
+    lowercased = (t[0].lower(),) + t[1:7] + (t[7].lower(),) + t[8:]
+    pool = LiquidityPool.from_tuple(lowercased, tokens, prices)
+
+    token0 = addresses.id(t[7])
+    assert pool.lp == t[0]
+    assert pool.token0 is tokens[token0]
+    assert pool.reserve0.amount == t[8] / 10 ** tokens[token0].decimals
+    assert pool.reserve0.price is prices[token0]
+    assert pool.weekly_emissions.amount == pytest.approx(
+        pool.emissions.amount * 7 * 24 * 60 * 60
+    )
+
+
+def test_repriced_pools():
+    pool_tuples, tokens, prices = make_pool_inputs(10)
+    pool = LiquidityPool.from_tuple(pool_tuples[0], tokens, prices)
+    assert pool.repriced(dict(tokens), dict(prices)) is pool
+
+    moved = dict(prices)
+    moved[pool.token0.token_id] = Price(token=pool.token0, price=123)
+    repriced = pool.repriced(tokens, moved)
+    assert repriced.reserve0.amount_in_stable == repriced.reserve0.amount * 123
+    assert pool.reserve0.price.price != 123
+
+    delisted = dict(tokens)
+    del delisted[pool.token1.token_id]
+    assert pool.repriced(delisted, prices).reserve1 is None
+    assert pool.repriced(delisted, prices).repriced(tokens, prices).reserve1
+
+
+def test_pool_decode_benchmark():
+    """Decode 10k Sugar tuples into pool records, plus the snapshot extras"""
+    pool_tuples, tokens, prices = make_pool_inputs(10_000)
+
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    pools = list(
+        map(lambda t: LiquidityPool.from_tuple(t, tokens, prices), pool_tuples)
+    )
+    decode_seconds = time.perf_counter() - started_at
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started_at = time.perf_counter()
+    PoolColumns.from_pools(pools, tokens, prices)
+    PoolSearchIndex(pools)
+    extras_seconds = time.perf_counter() - started_at
+
+    print(
+        f"\n10k pools: decode {decode_seconds * 1000:.0f}ms, "
+        f"columns + search index {extras_seconds * 1000:.0f}ms, "
+        f"{memory / len(pools):.0f} bytes per pool"
+    )
+
+    # eager Amount graphs took ~1KB per pool
+    assert memory / len(pools) < 400
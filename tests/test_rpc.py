@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from bots import rpc
+from bots.data import POOL_EVENT_TOPICS, SUGAR_BY_INDEX, Token, Price
+from bots.settings import LP_SUGAR_ADDRESS, LP_SUGAR_ABI
+from tests.synthetic import FakeNode
+
+
+@pytest.mark.asyncio
+async def test_prices_are_fetched_in_one_batch(node):
+    tokens = await Token.get_all_listed_tokens()
+    requests = node.http_requests
+
+    prices = await Price.get_prices(tokens)
+
+    assert len(prices) == len(tokens)
+    assert list(map(lambda p: p.token, prices)) == list(tokens)
+    assert prices[3].price == node.prices[tokens[3].token_address.lower()] / 10**18
+    # 50 tokens in chunks of 40 => 2 oracle calls in a single HTTP request
+    assert node.eth_calls().count("getManyRatesWithConnectors") == 2
+    assert node.http_requests == requests + 1
+
+
+@pytest.mark.asyncio
+async def test_prices_are_cached_per_token(node):
+    tokens = await Token.get_all_listed_tokens()
+    await Price.get_prices(tokens[:30])
+    calls = len(node.eth_calls())
+
+    # a single token priced by an earlier, bigger request is a cache hit
+    [price] = await Price.get_prices([tokens[7]])
+    assert price.token == tokens[7]
+    assert len(node.eth_calls()) == calls
+
+    # only the misses get priced, together
+    prices = await Price.get_prices(tokens)
+    assert list(map(lambda p: p.token, prices)) == list(tokens)
+    assert len(node.eth_calls()) == calls + 1
+
+    store = Price.price_store(*next(iter(Price._stores)))
+    assert store.stats.misses == len(tokens)
+    assert store.stats.hits == 31
+    assert store.hit_ratio == 31 / (31 + len(tokens))
+
+
+@pytest.mark.asyncio
+async def test_batches_are_split_when_rejected(node, monkeypatch):
+    monkeypatch.setattr(rpc, "_batch_size", 8)
+    node.max_batch_size = 3
+    sugar = rpc.w3.eth.contract(address=LP_SUGAR_ADDRESS, abi=LP_SUGAR_ABI)
+    calls = [
+        (LP_SUGAR_ADDRESS, sugar.functions.all(1, i)._encode_transaction_data())
+        for i in range(7)
+    ]
+
+    results = await rpc.batch_call(calls)
+
+    assert rpc._batch_size == 3
+    _, _, output_types = node.functions[bytes.fromhex(calls[0][1][2:10])]
+    lps = [rpc.w3.codec.decode(output_types, r)[0][0][0] for r in results]
+    assert lps == [node.pool_tuples[i][0].lower() for i in range(7)]
+
+
+@pytest.mark.asyncio
+async def test_routes_to_fastest_endpoint():
+    async with FakeNode(pools=1, delay=0.05) as slow, FakeNode(pools=1) as fast:
+        provider = rpc.RoutedHTTPProvider([slow.url, fast.url])
+
+        for _ in range(10):
+            response = await provider.make_request("eth_blockNumber", [])
+            assert response["result"] == hex(100)
+
+        await provider.close()
+
+    assert provider.ranked()[0].uri == fast.url
+    # unknown endpoints get probed once, then the fast one takes over
+    assert slow.http_requests == 1
+    assert fast.http_requests == 9
+
+
+@pytest.mark.asyncio
+async def test_fails_over_to_healthy_endpoint():
+    async with FakeNode(pools=1) as failing, FakeNode(pools=1) as healthy:
+        failing.failing = True
+        provider = rpc.RoutedHTTPProvider([failing.url, healthy.url])
+
+        for _ in range(5):
+            response = await provider.make_request("eth_blockNumber", [])
+            assert response["result"] == hex(100)
+
+        await provider.close()
+
+    failing_endpoint, healthy_endpoint = provider.endpoints
+    assert failing.http_requests == 1
+    assert healthy.http_requests == 5
+    assert not failing_endpoint.healthy
+    assert healthy_endpoint.error_rate == 0
+
+
+@pytest.mark.asyncio
+async def test_hedges_slow_calls():
+    async with FakeNode(pools=1) as first, FakeNode(pools=1) as second:
+        provider = rpc.RoutedHTTPProvider([first.url, second.url])
+        while len(provider.ranked()[0].latencies) < 10:
+            await provider.make_request("eth_blockNumber", [])
+
+        # fastest endpoint got slow, the hedged call to the other one wins
+        nodes = {first.url: first, second.url: second}
+        primary_endpoint = provider.ranked()[0]
+        primary, secondary = map(lambda e: nodes[e.uri], provider.ranked())
+        primary.delay = 1
+        requests = secondary.http_requests
+        samples = len(primary_endpoint.latencies)
+        started_at = time.monotonic()
+
+        response = await provider.make_request("eth_blockNumber", [])
+
+        assert response["result"] == hex(100)
+        assert time.monotonic() - started_at < 0.5
+        assert secondary.http_requests == requests + 1
+        # losing the race says nothing about how slow the endpoint is
+        assert len(primary_endpoint.latencies) == samples
+
+        await provider.close()
+
+
+@pytest.mark.asyncio
+async def test_hedges_per_call_kind():
+    async with FakeNode(pools=1) as first, FakeNode(pools=1) as second:
+        provider = rpc.RoutedHTTPProvider([first.url, second.url])
+        while len(provider.ranked()[0].latencies) < 10:
+            await provider.make_request("eth_blockNumber", [])
+
+        # heavier calls taking longer than cheap ones don't get hedged off
+        # cheap calls latencies
+        first.delay = second.delay = 0.2
+        requests = first.http_requests + second.http_requests
+
+        response = await provider.make_request("eth_chainId", [])
+
+        assert response["result"] == hex(10)
+        assert first.http_requests + second.http_requests == requests + 1
+
+        await provider.close()
+
+
+@pytest.mark.asyncio
+async def test_call_deadline(monkeypatch):
+    monkeypatch.setattr(rpc, "RPC_DEADLINE_SECONDS", 0.1)
+
+    async with FakeNode(pools=1, delay=0.5) as slow:
+        provider = rpc.RoutedHTTPProvider([slow.url])
+
+        with pytest.raises(asyncio.TimeoutError):
+            await provider.make_request("eth_blockNumber", [])
+
+        slow.delay = 0
+        response = await provider.make_request("eth_blockNumber", [])
+        assert response["result"] == hex(100)
+
+        await provider.close()
+
+
+@pytest.mark.asyncio
+async def test_pinned_calls_fail_over_lagging_endpoints(monkeypatch):
+    async with FakeNode(pools=3) as lagging, FakeNode(pools=3) as synced:
+        lagging.block_number = synced.block_number - 1
+        # keep the lagging endpoint the faster, preferred one
+        synced.delay = 0.02
+        provider = rpc.RoutedHTTPProvider([lagging.url, synced.url])
+        monkeypatch.setattr(rpc.w3, "provider", provider)
+
+        # block number came from the synced endpoint, lagging one is preferred
+        block_number = synced.block_number
+        pool = await rpc.call_in_thread(SUGAR_BY_INDEX(1), block_number)
+        [response] = await rpc.batch_call(
+            [(LP_SUGAR_ADDRESS, SUGAR_BY_INDEX.calldata(2))], block_number
+        )
+
+        assert pool[0] == synced.pool_tuples[1][0]
+        assert SUGAR_BY_INDEX.decode(response)[0] == synced.pool_tuples[2][0]
+        assert lagging.eth_calls() == ["byIndex", "byIndex"]
+
+        # nobody has it, the error surfaces
+        with pytest.raises(rpc.RPCError):
+            await rpc.call_in_thread(SUGAR_BY_INDEX(1), block_number + 1)
+
+        await provider.close()
+
+
+@pytest.mark.asyncio
+async def test_logs_are_parsed_off_the_loop(node):
+    node.logs += [(100, node.pool_tuples[1][0]), (101, node.pool_tuples[2][0])]
+
+    thread, logs = await rpc.get_logs_in_thread(
+        {
+            "fromBlock": 90,
+            "toBlock": 100,
+            "address": [node.pool_tuples[1][0]],
+            "topics": [POOL_EVENT_TOPICS],
+        },
+        lambda logs: (threading.get_ident(), logs),
+    )
+
+    assert thread != threading.get_ident()
+    assert list(map(lambda log: log["address"], logs)) == [node.pool_tuples[1][0]]
+    [(method, [log_filter])] = node.requests
+    assert (method, log_filter["fromBlock"], log_filter["toBlock"]) == (
+        "eth_getLogs",
+        "0x5a",
+        "0x64",
+    )
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from thefuzz import fuzz
+
+from bots.helpers import AddressIndexed
+from bots.search import PoolSearchIndex
+from tests.synthetic import make_pools
+
+
+@pytest.fixture(scope="module")
+def pools():
+    return AddressIndexed(make_pools(2000), key=lambda p: p.lp_id)
+
+
+def brute_force(pools, query, limit=10):
+    scores = sorted(
+        map(lambda p: fuzz.token_sort_ratio(query, p.symbol), pools), reverse=True
+    )
+    return scores[:limit]
+
+
+@pytest.mark.parametrize(
+    "query", ["usdc velo", "WETH/OP", "sAMM-DAI", "tkn12 tkn7", "wbt", "velo"]
+)
+def test_search_matches_brute_force(pools, query):
+    results = PoolSearchIndex.for_pools(pools).search(query)
+
+    assert len(results) == 10
+    assert list(map(lambda p: fuzz.token_sort_ratio(query, p.symbol), results)) == (
+        brute_force(pools, query)
+    )
+
+
+def test_search_exact_match():
+    pools = make_pools(50)
+    unique = next(
+        p for p in pools if len([o for o in pools if o.symbol == p.symbol]) == 1
+    )
+
+    assert PoolSearchIndex(pools).search(unique.symbol.upper()) == [unique]
+
+
+def test_search_index_is_built_once(pools):
+    assert PoolSearchIndex.for_pools(pools) is PoolSearchIndex.for_pools(pools)
+
+
+def test_autocomplete_prefixes(pools):
+    index = PoolSearchIndex.for_pools(pools)
+
+    by_symbol = index.autocomplete("samm-usdc")
+    assert len(by_symbol) > 0
+    assert all(p.symbol.lower().startswith("samm-usdc") for p in by_symbol[:3])
+
+    pool = pools[1234]
+    assert index.autocomplete(pool.lp.lower())[0] == pool
+
+    by_token = index.autocomplete("WBT")
+    assert len(by_token) == 25
+    assert "WBTC" in (by_token[0].token0.symbol, by_token[0].token1.symbol)
+
+    # nothing to prefix match, fuzzy matches fill in
+    assert len(index.autocomplete("velo usdc")) == 25
+
+
+@pytest.mark.benchmark
+def test_autocomplete_latency_at_10k_pools():
+    index = PoolSearchIndex(make_pools(10000))
+    queries = ["u", "us", "usd", "usdc", "usdc/", "usdc/ve", "0x02", "tkn4", "w et h"]
+    timings = []
+
+    for _ in range(20):
+        for query in queries:
+            started_at = time.perf_counter()
+            index.autocomplete(query)
+            timings.append(time.perf_counter() - started_at)
+
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"autocomplete @10k pools: p50 {timings[len(timings) // 2] * 1000:.2f}ms")
+    print(f"autocomplete @10k pools: p99 {p99 * 1000:.2f}ms")
+    # discord gives us 3 seconds, stay orders of magnitude below that
+    assert p99 < 0.05
@@ -0,0 +1,324 @@
+import asyncio
+import gc
+import glob
+import time
+
+import numpy as np
+import pytest
+
+from bots.helpers import addresses
+from bots.metrics import LoopLagMonitor
+from bots.snapshot import SnapshotEngine
+from tests.synthetic import make_pool_tuples
+
+
+@pytest.mark.asyncio
+async def test_snapshot_build(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    snapshot = await engine.get()
+
+    assert snapshot.version == 1
+    assert len(snapshot.tokens) == len(node.token_tuples)
+    assert len(snapshot.pools) == len(node.pool_tuples)
+    assert len(snapshot.epochs) == len(node.epoch_tuples)
+    assert snapshot.tvl == pytest.approx(
+        sum(map(lambda p: p.reserve0.amount_in_stable, snapshot.pools))
+        + sum(map(lambda p: p.reserve1.amount_in_stable, snapshot.pools))
+    )
+
+    lp = node.pool_tuples[42][0]
+    assert snapshot.pool(lp.lower()).lp == lp
+    assert snapshot.epoch_for_pool(lp).pool_address == lp
+    assert snapshot.price(node.token_tuples[0][0]).token.symbol == "USDC"
+
+    pool = snapshot.pool(lp)
+    tvl = pool.reserve0.amount_in_stable + pool.reserve1.amount_in_stable
+    assert snapshot.pool_metrics(lp) == pytest.approx((tvl, pool.apr(tvl)))
+    assert snapshot.pool_metrics("0x" + "cd" * 20) is None
+
+    with pytest.raises(TypeError):
+        snapshot.prices["foo"] = None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_search_index_built_for_searching_bots(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    snapshot = await engine.get()
+    assert getattr(snapshot.pools, "search_index", None) is None
+
+    engine.index_search = True
+    node.block_number += 1
+    snapshot = await engine.refresh()
+    assert snapshot.pools.search_index is not None
+    assert snapshot.autocomplete(node.pool_tuples[7][1])[0].lp == node.pool_tuples[7][0]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_refresh_is_shared(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    first = await engine.get()
+    node.block_number += 1
+
+    snapshots = await asyncio.gather(*[engine.refresh() for _ in range(5)])
+
+    assert {s.version for s in snapshots} == {2}
+    assert engine.current is snapshots[0]
+    assert engine.current is not first
+    # five refreshes, one new build
+    assert node.eth_calls().count("tokens") == 2
+    assert node.eth_calls().count("epochsLatest") == 2
+
+
+@pytest.mark.asyncio
+async def test_snapshot_reads_are_pinned_to_a_block(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    snapshot = await engine.get()
+
+    assert snapshot.block_number == node.block_number
+    blocks = {params[1] for method, params in node.requests if method == "eth_call"}
+    assert blocks == {hex(node.block_number)}
+
+
+@pytest.mark.asyncio
+async def test_snapshot_refreshes_follow_one_schedule(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    assert engine.due_in() == 0
+
+    # e.g. a ticker prefetch refreshing it first
+    node.block_number += 1
+    first = await engine.get_fresh(50)
+    calls = len(node.requests)
+    assert 59 < engine.due_in() <= 60
+
+    # the engine loop picks up from there rather than refreshing on its own
+    task = engine.start()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    task.cancel()
+
+    assert len(node.requests) == calls
+    assert await engine.get_fresh(50) is first
+
+
+@pytest.mark.asyncio
+async def test_snapshot_refresh_skipped_when_head_has_not_moved(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    first = await engine.get()
+    calls = len(node.eth_calls())
+
+    assert await engine.refresh() is first
+    assert len(node.eth_calls()) == calls
+
+
+@pytest.mark.asyncio
+async def test_snapshot_refetches_only_changed_pools(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    first = await engine.get()
+    calls = len(node.eth_calls())
+
+    node.block_number += 3
+    lp = node.pool_tuples[42][0]
+    node.update_pool(42, reserve0=node.pool_tuples[42][8] * 2)
+    node.pool_tuples.append(make_pool_tuples(1235, node.token_tuples)[-1])
+    # same event, some other contract
+    node.logs.append((node.block_number, "0x" + "ab" * 20))
+    snapshot = await engine.refresh()
+
+    # changed pool by index, new pool from the tail page, nothing else
+    assert sorted(node.eth_calls()[calls:]) == [
+        "all",
+        "byIndex",
+        "epochsLatest",
+        "getManyRatesWithConnectors",
+        "getManyRatesWithConnectors",
+        "tokens",
+    ]
+    assert snapshot.pool(lp).reserve0.amount == 2 * first.pool(lp).reserve0.amount
+    assert len(snapshot.pools) == len(first.pools) + 1
+    assert snapshot.pool(node.pool_tuples[-1][0]) is not None
+    # untouched pools with unchanged prices are reused as is
+    assert snapshot.pools[7] is first.pools[7]
+    assert snapshot.synced_at == first.synced_at
+    # logs only get requested for known pools and their gauges
+    log_filters = [
+        params[0] for method, params in node.requests if method == "eth_getLogs"
+    ]
+    assert max(map(lambda f: len(f["address"]), log_filters)) <= 500
+    assert sum(map(lambda f: len(f["address"]), log_filters)) == 2 * len(first.pools)
+    # events from contracts nobody asked about don't grow the address table
+    assert addresses.find("0x" + "ab" * 20) is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_update_picks_up_listed_tokens(node):
+    index = next(
+        i for i, t in enumerate(node.pool_tuples) if t[7] == node.token_tuples[5][0]
+    )
+    node.token_tuples[5] = node.token_tuples[5][:4] + (False,)
+    engine = SnapshotEngine(refresh_seconds=60)
+    first = await engine.get()
+    assert first.pools[index].reserve0 is None
+
+    # listed again, nothing happening in the pool itself
+    node.token_tuples[5] = node.token_tuples[5][:4] + (True,)
+    node.block_number += 1
+    snapshot = await engine.refresh()
+
+    assert "byIndex" not in node.eth_calls()
+    assert len(snapshot.tokens) == len(first.tokens) + 1
+    assert snapshot.pools[index].token0.token_address == node.token_tuples[5][0]
+    assert snapshot.pools[index].reserve0 is not None
+    assert snapshot.columns.tvl[index] > first.columns.tvl[index]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_refetches_pools_with_gauge_changes(node):
+    engine = SnapshotEngine(refresh_seconds=60)
+    first = await engine.get()
+    calls = len(node.eth_calls())
+
+    node.block_number += 1
+    lp = node.pool_tuples[9][0]
+    node.update_gauge(9, gauge_liquidity=0)
+    snapshot = await engine.refresh()
+
+    assert node.eth_calls()[calls:].count("byIndex") == 1
+    assert first.pool(lp).gauge_total_supply > 0
+    assert snapshot.pool(lp).gauge_total_supply == 0
+
+
+@pytest.mark.asyncio
+async def test_snapshot_update_falls_back_to_full_resync(node, monkeypatch):
+    engine = SnapshotEngine(refresh_seconds=60)
+    first = await engine.get()
+
+    async def update_pools(*args):
+        raise ValueError("query returned more than 10000 results")
+
+    monkeypatch.setattr("bots.snapshot.LiquidityPool.update_pools", update_pools)
+    node.block_number += 1
+    snapshot = await engine.refresh()
+
+    assert snapshot.version == first.version + 1
+    assert len(snapshot.pools) == len(first.pools)
+    assert snapshot.synced_at > first.synced_at
+
+
+@pytest.mark.asyncio
+async def test_snapshot_full_resync(node, monkeypatch):
+    engine = SnapshotEngine(refresh_seconds=60)
+    first = await engine.get()
+
+    node.block_number += 1
+    monkeypatch.setattr("bots.snapshot.POOL_FULL_RESYNC_MINUTES", -1)
+    snapshot = await engine.refresh()
+
+    assert "byIndex" not in node.eth_calls()
+    assert snapshot.synced_at > first.synced_at
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_snapshot_build_keeps_loop_responsive(big_remote_node):
+    # same as __main__ does on startup
+    gc.freeze()
+    monitor = LoopLagMonitor(interval_seconds=0.005)
+    monitor.start()
+    await asyncio.sleep(0.05)
+
+    snapshot = await SnapshotEngine(refresh_seconds=60).refresh()
+    monitor.stop()
+    gc.unfreeze()
+
+    assert len(snapshot.pools) == 10_000
+    print(
+        f"\nloop lag during 10k pool snapshot build: "
+        f"p50 {monitor.lags.percentile(50) * 1000:.1f}ms, "
+        f"p99 {monitor.lags.percentile(99) * 1000:.1f}ms, "
+        f"max {monitor.max_lag * 1000:.1f}ms"
+    )
+    assert monitor.max_lag < 0.05
+
+
+@pytest.mark.asyncio
+async def test_snapshot_warm_start(node, tmp_path):
+    path = str(tmp_path / "snapshot.sqlite3")
+    node.delay = 0.05
+
+    started_at = time.perf_counter()
+    engine = SnapshotEngine(refresh_seconds=60, path=path)
+    built = await engine.get()
+    cold_seconds = time.perf_counter() - started_at
+    await engine._persisting
+
+    started_at = time.perf_counter()
+    restarted = SnapshotEngine(refresh_seconds=60, path=path)
+    restored = await restarted.restore()
+    warm_seconds = time.perf_counter() - started_at
+
+    print(
+        f"\ntime to first snapshot: cold {cold_seconds * 1000:.0f}ms, "
+        f"warm {warm_seconds * 1000:.0f}ms"
+    )
+
+    assert restored.stale and not built.stale
+    assert (restored.version, restored.block_number, restored.synced_at) == (
+        built.version,
+        built.block_number,
+        built.synced_at,
+    )
+    assert len(restored.pools) == len(built.pools)
+    assert restored.tvl == pytest.approx(built.tvl)
+    assert restored.epoch_bribes == pytest.approx(built.epoch_bribes)
+    pool = node.pool_tuples[3][0]
+    assert restored.pool(pool).reserve0 == built.pool(pool).reserve0
+
+    # restored snapshot gets caught up incrementally
+    node.block_number += 1
+    node.requests.clear()
+    snapshot = await restarted.refresh()
+
+    assert not snapshot.stale
+    assert snapshot.version == built.version + 1
+    assert node.eth_calls().count("all") == 1
+    await restarted._persisting
+
+
+@pytest.mark.asyncio
+async def test_snapshot_followers(node, tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot.sqlite3")
+    monkeypatch.setattr("bots.snapshot.SNAPSHOT_FOLLOW_SECONDS", 0.01)
+    fetcher = SnapshotEngine(refresh_seconds=60, path=path)
+    followers = [
+        SnapshotEngine(refresh_seconds=60, path=path, follow=True) for _ in range(3)
+    ]
+
+    # followers wait for the first snapshot to get published
+    following = asyncio.gather(*map(lambda f: f.get(), followers))
+    published = await fetcher.get()
+    await fetcher._persisting
+    requests = len(node.requests)
+    snapshots = await following
+
+    assert len(node.requests) == requests
+    for snapshot in snapshots:
+        assert not snapshot.stale
+        assert snapshot.version == published.version
+        assert len(snapshot.pools) == len(published.pools)
+        assert snapshot.tvl == pytest.approx(published.tvl)
+        # mapped from the published columns file rather than rebuilt
+        assert isinstance(snapshot.columns.reserve0, np.memmap)
+
+    # nothing new published, nothing reloaded
+    assert await followers[0].refresh() is snapshots[0]
+
+    for _ in range(3):
+        node.block_number += 1
+        latest = await fetcher.refresh()
+        await fetcher._persisting
+
+    snapshot = await followers[0].refresh()
+    assert snapshot.version == latest.version
+    assert snapshot.block_number == latest.block_number
+    # columns of older snapshots get cleaned up
+    assert len(glob.glob(f"{path}.v*.columns.npy")) == 2
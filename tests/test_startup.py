@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import subprocess  # noqa: S404
+import sys
+
+import pytest
+
+from bots import __main__ as entrypoint, snapshot
+from bots.snapshot import SnapshotEngine
+
+# imports what `python -m bots` does, reporting time taken and modules loaded
+IMPORT_PROBE = """
+import json, sys, time
+
+started_at = time.perf_counter()
+import bots.settings
+settings_seconds = time.perf_counter() - started_at
+settings_modules = set(sys.modules)
+import bots.__main__
+main_seconds = time.perf_counter() - started_at
+
+print(json.dumps({
+    "settings_seconds": settings_seconds,
+    "main_seconds": main_seconds,
+    "settings_modules": sorted(settings_modules),
+    "main_modules": sorted(sys.modules),
+}))
+"""
+
+
+class FakeBot:
+    """Bot taking a while to log in, records once it is ready"""
+
+    login_seconds = 0.1
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    async def start(self, discord_token: str):
+        await asyncio.sleep(self.login_seconds)
+        ready[discord_token] = self.kwargs
+
+
+ready = {}
+
+
+def test_startup_imports():
+    probe = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    result = json.loads(probe.stdout)
+
+    print(
+        f"\nimport time: bots.settings {result['settings_seconds'] * 1000:.0f}ms, "
+        f"bots.__main__ {result['main_seconds'] * 1000:.0f}ms"
+    )
+    # settings are everywhere, web3 only comes with RPC
+    assert "web3" not in result["settings_modules"]
+    # so do data and snapshots, with numpy and sqlite3, once running
+    assert "web3" not in result["main_modules"]
+    assert "numpy" not in result["main_modules"]
+    assert "sqlite3" not in result["main_modules"]
+    # bots (and discord.py with them) get imported once known to be configured
+    assert "bots.ticker" not in result["main_modules"]
+    assert "bots.commander" not in result["main_modules"]
+    assert "discord" not in result["main_modules"]
+
+
+@pytest.mark.asyncio
+async def test_bots_log_in_while_loading(node, monkeypatch):
+    engine = SnapshotEngine(refresh_seconds=60)
+    monkeypatch.setattr(snapshot, "snapshots", engine)
+    monkeypatch.setattr(entrypoint, "TOKEN_ADDRESS", node.token_tuples[1][0])
+    monkeypatch.setattr(entrypoint, "STABLE_TOKEN_ADDRESS", node.token_tuples[0][0])
+    ready.clear()
+
+    node.paused = True
+    running = asyncio.create_task(
+        entrypoint.run_bots(
+            [
+                ("price", FakeBot, entrypoint.price_bot_kwargs),
+                ("tvl", FakeBot, entrypoint.protocol_bot_kwargs),
+            ]
+        )
+    )
+    # nothing but logging in holds up bots not needing tokens
+    while "tvl" not in ready:
+        await asyncio.sleep(0.01)
+    assert node.requests == []
+    assert engine.current is None
+    assert "price" not in ready
+
+    node.paused = False
+    while "price" not in ready:
+        await asyncio.sleep(0.01)
+    # snapshots keep getting refreshed for as long as the bots run
+    running.cancel()
+    await engine.refresh()
+
+    # token lookups share one Sugar call, snapshot builds read at a pinned block
+    calls = filter(lambda request: request[0] == "eth_call", node.requests)
+    blocks = [
+        params[1]
+        for (_, params), name in zip(calls, node.eth_calls(), strict=True)
+        if name == "tokens"
+    ]
+    assert blocks.count("latest") == 1
+    price_kwargs = ready["price"]
+    assert price_kwargs["source_token"].token_address == node.token_tuples[1][0]
+    assert price_kwargs["target_token"].token_address == node.token_tuples[0][0]
+
+
+@pytest.mark.asyncio
+async def test_followers_look_tokens_up_in_published_snapshots(
+    node, tmp_path, monkeypatch
+):
+    path = str(tmp_path / "snapshot.sqlite3")
+    fetcher = SnapshotEngine(refresh_seconds=60, path=path)
+    await fetcher.get()
+    await fetcher._persisting
+    monkeypatch.setattr(
+        snapshot,
+        "snapshots",
+        SnapshotEngine(refresh_seconds=60, path=path, follow=True),
+    )
+    monkeypatch.setattr(entrypoint, "TOKEN_ADDRESS", node.token_tuples[1][0])
+    monkeypatch.setattr(entrypoint, "STABLE_TOKEN_ADDRESS", node.token_tuples[0][0])
+    requests = len(node.requests)
+
+    price_kwargs = await entrypoint.price_bot_kwargs()
+    assert price_kwargs["source_token"].token_address == node.token_tuples[1][0]
+    assert price_kwargs["target_token"].token_address == node.token_tuples[0][0]
+    # unlisted tokens don't get looked up over RPC either
+    assert await entrypoint.get_token("0x" + "ab" * 20) is None
+    assert len(node.requests) == requests
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from types import SimpleNamespace
+
+from bots.ticker import NickUpdater, Published, TickScheduler
+
+
+class FakeMember:
+    """Bot member of a guild, counts concurrent edits"""
+
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, nick: str):
+        self.nick = nick
+        self.edits = 0
+
+    async def edit(self, nick: str):
+        FakeMember.in_flight += 1
+        FakeMember.max_in_flight = max(FakeMember.max_in_flight, FakeMember.in_flight)
+        await asyncio.sleep(0.01)
+        FakeMember.in_flight -= 1
+        self.edits += 1
+        self.nick = nick
+
+
+@pytest.mark.asyncio
+async def test_nick_updates_skip_guilds_up_to_date():
+    guilds = [
+        SimpleNamespace(id=i, me=FakeMember("~$1.0" if i % 4 == 0 else "~$0.9"))
+        for i in range(40)
+    ]
+    updater = NickUpdater(window_seconds=0.05, concurrency=3, significance_threshold=0)
+    edits = []
+
+    assert await updater.update(guilds, "~$1.0", on_edit=lambda: edits.append(1)) == 30
+    assert FakeMember.max_in_flight <= 3
+    assert all(map(lambda g: g.me.nick == "~$1.0", guilds))
+    assert len(edits) == 30
+
+    # nothing left to do, even without the gateway refreshing guild.me
+    for guild in filter(lambda g: g.me.edits, guilds):
+        guild.me.nick = "~$0.9"
+    assert await updater.update(guilds, "~$1.0", on_edit=lambda: edits.append(1)) == 0
+    assert sum(map(lambda g: g.me.edits, guilds)) == 30
+    assert len(edits) == 30
+
+
+@pytest.mark.asyncio
+async def test_nick_updates_only_on_significant_moves(monkeypatch):
+    guilds = [SimpleNamespace(id=1, me=FakeMember(None))]
+    updater = NickUpdater(window_seconds=0, concurrency=1, significance_threshold=0.005)
+
+    assert await updater.update(guilds, "~$1.000", 1.000) == 1
+    assert await updater.update(guilds, "~$1.004", 1.004) == 0
+    assert await updater.update(guilds, "~$1.006", 1.006) == 1
+    assert await updater.update(guilds, "~$1.006", 1.006) == 0
+
+    # forced refresh catches up on drift
+    monkeypatch.setattr("bots.ticker.TICKER_FORCE_REFRESH_MINUTES", 0)
+    assert await updater.update(guilds, "~$1.007", 1.007) == 1
+
+
+def test_published_changes():
+    published = Published.now("TVL ~$1.2M", None)
+
+    assert not published.is_outdated_by("TVL ~$1.2M", None, 0)
+    assert published.is_outdated_by("TVL ~$1.3M", None, 0)
+    assert published.is_outdated_by("TVL ~$1.3M", None, 0.5)
+
+
+@pytest.mark.asyncio
+async def test_ticks_are_prefetched():
+    events = []
+    ticked = asyncio.Event()
+
+    async def prefetch():
+        events.append("prefetch")
+        await asyncio.sleep(0.01)
+        events.append("prefetched")
+
+    async def tick():
+        events.append("tick")
+        # only the first update of a tick counts
+        scheduler.mark_update()
+        scheduler.mark_update()
+        if events.count("tick") == 3:
+            ticked.set()
+
+    scheduler = TickScheduler(0.05, 0.03, 0.02, prefetch, tick)
+    task = asyncio.create_task(scheduler.run())
+    await ticked.wait()
+    task.cancel()
+
+    # every tick finds its prefetch done
+    assert events == ["prefetch", "prefetched", "tick"] * 3
+    assert len(scheduler.latency) == 3
+    # updates outside of a tick aren't ticks' latency
+    scheduler.mark_update()
+    assert len(scheduler.latency) == 3